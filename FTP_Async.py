@@ -0,0 +1,147 @@
+#asyncio version of the client for use as a library: one AsyncFTPClient per control connection,
+#as many of them as you like in one event loop. same commands and reply grammar as FTP_Client.py
+#(its generators build the commands, its parse_reply reads the answers); nothing is echoed anywhere,
+#each call returns the parsed replies instead
+#
+#    async with AsyncFTPClient() as ftp:
+#        await ftp.connect("localhost",2121)
+#        await ftp.login()
+#        await ftp.get("README.md","copy.md")
+
+import asyncio
+import os
+from pathlib import Path
+from typing import Literal
+
+from FTP_Client import (FTPError, FTPReplyError, generate_connect_output, generate_get_output,
+                        generate_passive_get_output, parse_pasv_address, parse_reply)
+
+class AsyncFTPClient:
+    def __init__(self,passive:bool=True,timeout:float|None=30.0,chunk:int=256*1024):
+        self.passive = passive
+        self.timeout = timeout #for any one reply or connect; None waits forever
+        self.chunk = chunk
+        self.reader:asyncio.StreamReader|None = None
+        self.writer:asyncio.StreamWriter|None = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self,*exc_info):
+        await self.close()
+
+    async def connect(self,host:str,port:int)->str:
+        #returns the greeting
+        self.reader,self.writer = await self.wait(asyncio.open_connection(host,port))
+        return await self.reply()
+
+    async def login(self)->list[str]:
+        #USER/PASS/SYST/TYPE, exactly what the CONNECT command sends
+        return [await self.command(command) for command in generate_connect_output()]
+
+    async def get(self,file_path:str,destination:str|os.PathLike|None=None)->int:
+        #fetches file_path into destination (its base name in the working directory by default),
+        #returning the number of bytes received; a refused or failed transfer raises FTPError
+        destination = Path(destination if destination is not None else Path(file_path).name)
+        loop = asyncio.get_running_loop()
+        listener = None
+        if self.passive: #connected before RETR goes out, like process_get_passive
+            setup,retr = generate_passive_get_output(file_path)
+            address = parse_pasv_address(await self.command(setup),self.writer.get_extra_info("socket"))
+            if address is None:
+                raise FTPError("PASV reply has no data address")
+            connection = loop.create_future()
+            connection.set_result(await self.wait(asyncio.open_connection(*address)))
+        else: #the server connects to us once it has the RETR
+            connection = loop.create_future()
+            def connected(reader:asyncio.StreamReader,writer:asyncio.StreamWriter):
+                if connection.done():
+                    writer.close()
+                else:
+                    connection.set_result((reader,writer))
+            my_ip = self.writer.get_extra_info("sockname")[0]
+            listener = await asyncio.start_server(connected,my_ip,0,backlog=1)
+            setup,retr = generate_get_output(listener.sockets[0].getsockname()[1],file_path,my_ip)
+            await self.command(setup)
+
+        #RETR answers at once, 150 or a refusal, and with its final reply once the transfer is over;
+        #a refusal or a failure (425 once an active-mode connect fails) can come instead of (or in the
+        #middle of) the data, so the control connection is watched the whole time, past any 1xx
+        self.send(retr)
+        control = asyncio.ensure_future(self.reply(timeout=None))
+        transfer = asyncio.ensure_future(self.receive(connection,destination))
+        try:
+            final = None
+            while final is None:
+                await asyncio.wait([control] if transfer.done() else [control,transfer],return_when=asyncio.FIRST_COMPLETED)
+                if transfer.done() and transfer.exception() is not None:
+                    raise transfer.exception()
+                if control.done():
+                    reply = control.result() #raises FTPError for a refusal or a failed transfer
+                    if reply.startswith("FTP reply 1"): #preliminary, the final reply is still to come
+                        control = asyncio.ensure_future(self.reply(timeout=None))
+                    else:
+                        final = reply
+            received = await transfer
+        except BaseException:
+            destination.unlink(missing_ok=True)
+            raise
+        finally:
+            for task in (control,transfer):
+                task.cancel()
+            if not connection.done():
+                connection.cancel()
+            if listener is not None:
+                listener.close()
+        return received
+
+    async def receive(self,connection:"asyncio.Future[tuple[asyncio.StreamReader,asyncio.StreamWriter]]",destination:Path)->int:
+        reader,writer = await self.wait(connection)
+        received = 0
+        try:
+            with open(destination,"wb") as f:
+                while chunk := await self.wait(reader.read(self.chunk)):
+                    f.write(chunk)
+                    received += len(chunk)
+        finally:
+            writer.close()
+        return received
+
+    async def quit(self)->str:
+        try:
+            return await self.command("QUIT\r\n")
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.reader = self.writer = None
+
+    async def command(self,command:str)->str:
+        self.send(command)
+        return await self.reply()
+
+    def send(self,command:str):
+        if self.writer is None:
+            raise ConnectionError("not connected")
+        self.writer.write(command.encode('utf-8'))
+
+    async def reply(self,timeout:"float|None|Literal['default']"="default")->str:
+        #the next reply, parsed; 4xx/5xx raise FTPError with the parsed text
+        line = await self.wait(self.reader.readline(),timeout)
+        if not line:
+            raise ConnectionResetError("control connection closed")
+        reply,code = parse_reply(line.decode('utf-8'))
+        if "ERROR" in reply:
+            raise FTPReplyError(reply)
+        if 400 <= code <= 599:
+            raise FTPError(reply)
+        return reply
+
+    async def wait(self,awaitable,timeout:"float|None|Literal['default']"="default"):
+        return await asyncio.wait_for(awaitable,self.timeout if timeout == "default" else timeout)
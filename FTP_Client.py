@@ -4,16 +4,41 @@
 #           Starter Code          #
 ###################################
 
+import atexit
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import itertools
 import logging
 from pathlib import Path
+import re
 from select import select
+import selectors
 import sys
 import os
+import threading
 import socket as sock
 from socket import *
 import time
 from typing import Iterable, Iterator
+import zlib
+
+from FTP_Logging import LEVELS, setup_logging
+from FTP_Transcript import StdoutTranscript, add_transcript_arguments, transcript_from_arguments
+
+log = logging.getLogger()
+
+TRANSCRIPT:StdoutTranscript = StdoutTranscript() #where writeOutput sends everything
+
+#how GET moves bytes from a data connection to disk, see Receiver
+RECV_MODES = ["recv","recv_into","splice"]
+RECV_MODE = "recv_into"
+RECV_CHUNK = 256*1024
+
+#idle logged-in control connections kept for a later CONNECT to the same server, see SessionPool.
+#off unless --pool-size asks for it: a pooled CONNECT skips the QUIT/login exchange in the transcript
+POOL_SIZE = 0
+KEEPALIVE = 30.0 #seconds idle before a pooled connection gets a NOOP
 
 # Define dictionary of useful ASCII codes
 # Use ord(char) to get decimal ascii code for char
@@ -23,6 +48,10 @@ ascii_codes = {
     "0": ord("0"), "9": ord("9"),
     "min_ascii_val": 0, "max_ascii_val": 127}
 
+#the grammar's character classes, for parsers that scan a whole run in one go
+NON_ASCII = re.compile(r"[^\x00-\x7f]")
+LET_DIG_HYP = re.compile(r"[A-Za-z0-9-]*")
+
 ##############################################################################################
 #                                                                                            # 
 #     This function is intended to manage the command processing loop.                       #
@@ -30,17 +59,20 @@ ascii_codes = {
 #     was entered, and then delegate the command-processing to the appropriate function.     #
 #                                                                                            #
 ##############################################################################################
-def read_commands():
+def read_commands(base_port:int,pipeline:bool=False,passive:bool=True,segments:int=1,mode_z:bool=False):
     # Initially, only the CONNECT command is valid
     # Commands are case-sensitive
     expected_commands = ["CONNECT"]
 
     # Initial port number for a “welcoming” socket 
-    welcoming_port = int(sys.argv[1])                     # sys.argv[0] is the filename
+    welcoming_port = base_port
     ftp_control_connection = None
     num_copied_files = 1
-
-
+    compressed = False #MODE Z accepted on this connection
+    pool = SessionPool()
+    if pool.size > 0:
+        atexit.register(pool.close)
+    session:PooledSession|None = None
 
     for command in sys.stdin:
         # Echo command exactly as it was input
@@ -56,25 +88,38 @@ def read_commands():
                         if reply.startswith("ERROR"):
                             continue
 
-                        if ftp_control_connection is not None:
+                        if session is not None and pool.size > 0: #park it, the script may come back to this server
+                            pool.put(session)
+                        elif ftp_control_connection is not None:
                             writeOutput(send_commands(ftp_control_connection,["QUIT\r\n"]))
                             ftp_control_connection.close()
-
-                        try:
-                            #make connection with server
-                            ftp_control_connection = socket(sock.AF_INET,sock.SOCK_STREAM)
-                            ftp_control_connection.connect((host,port))
-                        except (ConnectionError, gaierror, OSError):
-                            ftp_control_connection = None #clear bad connection
-                            writeOutput("CONNECT failed\n",raw=False);
-                            continue
+                        session = ftp_control_connection = None
+
+                        session = pool.take((host,port))
+                        if session is None:
+                            try:
+                                #make connection with server
+                                ftp_control_connection = socket(sock.AF_INET,sock.SOCK_STREAM)
+                                ftp_control_connection.connect((host,port))
+                            except (ConnectionError, gaierror, OSError):
+                                ftp_control_connection = None #clear bad connection
+                                writeOutput("CONNECT failed\n",raw=False);
+                                continue
                         
-                        writeOutput(send_commands(ftp_control_connection,[None])) #get server response! kind of a hack oh well
-
-                        process_connect(ftp_control_connection);
-                        welcoming_port = int(sys.argv[1]);
+                            try:
+                                writeOutput(send_commands(ftp_control_connection,[None])) #get server response! kind of a hack oh well
+                            except FTPError: #turned away (421), nothing to log in to
+                                ftp_control_connection.close()
+                                ftp_control_connection = None
+                                continue
+
+                            process_connect(ftp_control_connection,pipeline=pipeline);
+                            compressed = mode_z and process_mode_z(ftp_control_connection)
+                            session = PooledSession((host,port),ftp_control_connection,compressed)
+                        ftp_control_connection,compressed = session.conn,session.compressed
+                        welcoming_port = base_port;
                         
-                        expected_commands = ["CONNECT","GET","QUIT"]
+                        expected_commands = ["CONNECT","GET","MGET","QUIT"]
                     case 'GET':
                         assert ftp_control_connection is not None
                         reply,pathname = parse_get(command)
@@ -82,10 +127,24 @@ def read_commands():
 
                         if reply.startswith("ERROR"):
                             continue
+                        if passive and segments > 1:
+                            num_copied_files += process_get_segmented(ftp_control_connection,pathname,num_copied_files,segments,compressed);
+                            continue
+                        if passive:
+                            num_copied_files += process_get_passive(ftp_control_connection,pathname,num_copied_files,compressed);
+                            continue
                         try:
-                            num_copied_files += process_get(ftp_control_connection,welcoming_port,pathname,num_copied_files);
+                            num_copied_files += process_get(ftp_control_connection,welcoming_port,pathname,num_copied_files,compressed);
                         finally:#it feels like this is the right thing to do
                             welcoming_port += 1 
+                    case 'MGET':
+                        assert ftp_control_connection is not None
+                        reply,target = parse_mget(command)
+                        writeOutput(reply + "\n",raw=False)
+
+                        if reply.startswith("ERROR"):
+                            continue
+                        num_copied_files += process_mget(ftp_control_connection,target,num_copied_files,passive,compressed);
                     case 'QUIT':
                         assert ftp_control_connection is not None
                         reply = parse_quit(command);
@@ -97,6 +156,7 @@ def read_commands():
                         process_quit(ftp_control_connection);
 
                         ftp_control_connection.close()
+                        pool.close()
 
                         sys.exit(0)
             except FTPReplyError as e:
@@ -114,11 +174,10 @@ def writeOutput(output:str|Iterator[str],raw=True,encoding:str="utf-8"):
     for text in output:
         if raw:
             # logging.info(f"writing raw text ({len(text)} characters):\n" + text)
-            sys.stdout.buffer.write(text.encode(encoding=encoding))
+            TRANSCRIPT.write(text.encode(encoding=encoding))
         else:
             # logging.info(f"writing non-raw text ({len(text)} characters):\n" + text)
-            sys.stdout.write(text)
-        sys.stdout.flush()
+            TRANSCRIPT.write_text(text)
 
 
 
@@ -129,20 +188,16 @@ class FTPReplyError(Exception):
 class FTPError(Exception):
     pass
 
-def send_commands(fcc:socket,commands:Iterable[str|None]):
+def send_commands(fcc:socket,commands:Iterable[str|None],pipeline:bool=False):
     # commands = list(commands)
     # logging.info("sending command batch: " + "|".join(commands))
     def isError(code:int):
         return 400 <= code <= 599
-    for comm in commands:
 
-        if comm is not None: #allow for a null command to pick up the initial response
-            fcc.send(comm.encode('utf-8'))
-            
-            yield comm
-        else:
-            comm = ""
+    buff = "" #to hold text from server, kept across commands since pipelined replies can arrive together
 
+    def read_reply(comm:str):
+        nonlocal buff
         #so here's the fun part. How do I know when the server's stopped sending a reply?
         #well, we can assume the server is formatting everything, so the end of one line will always be \r\n
         #however, how many lines is it going to send?
@@ -152,15 +207,14 @@ def send_commands(fcc:socket,commands:Iterable[str|None]):
         #RETR is weird, because it doesn't *always* return two - however, it's still deterministic based on the first reply
         #if the first response is an error, there won't be another; otherwise, there will *always* be another, error or success
 
-        is_retr = comm.lower().startswith("retr")
+        is_retr = comm.lower().startswith(("retr","nlst")) #both answer 150 before their final reply
 
         error = None
 
         resp = "" #to be returned
-        buff = "" #to hold text from server
         for it in [1,2]: #this loop will only ever run once or twice
             while True: 
-                logging.info("Awaiting reply, curent buffer:\n"+buff)
+                logging.info("Awaiting reply, curent buffer:\n%s",buff)
                 if ("\n" in buff):
                     break;
                 fcc.settimeout(5)
@@ -169,7 +223,8 @@ def send_commands(fcc:socket,commands:Iterable[str|None]):
                 except TimeoutError:
                     pass
                 
-            logging.info("newlines in buffer: " + str(buff.count("\n")))
+            if log.isEnabledFor(logging.INFO):
+                logging.info("newlines in buffer: %d",buff.count("\n"))
             ind = buff.index("\n")+1
             
             reply,buff = buff[:ind],buff[ind:]
@@ -186,10 +241,32 @@ def send_commands(fcc:socket,commands:Iterable[str|None]):
                 continue
 
             break
-        
+        return resp,error
+
+    if pipeline:
+        #send the whole batch up front, then read the replies back in order: one round trip instead of one per command
+        commands = list(commands)
+        fcc.sendall("".join(comm for comm in commands if comm is not None).encode('utf-8'))
+
+    for i,comm in enumerate(commands):
+
+        if comm is not None: #allow for a null command to pick up the initial response
+            if not pipeline:
+                fcc.send(comm.encode('utf-8'))
+            
+            yield comm
+        else:
+            comm = ""
+
+        resp,error = read_reply(comm)
         
         yield resp
         if error is not None:
+            if pipeline:
+                #the rest of the batch was already sent; swallow its replies so the connection stays in sync
+                assert isinstance(commands,list)
+                for rest in commands[i+1:]:
+                    read_reply(rest or "")
             raise FTPError(error)
 
 
@@ -205,14 +282,302 @@ def send_commands(fcc:socket,commands:Iterable[str|None]):
 #     parsing any responses the server returns                                               #
 #                                                                                            #
 ##############################################################################################
-def process_connect(ftp_control_connection:socket):
+def process_connect(ftp_control_connection:socket,pipeline:bool=False):
     commands = generate_connect_output()
 
     try:
-        writeOutput(send_commands(ftp_control_connection,commands));
+        writeOutput(send_commands(ftp_control_connection,commands,pipeline=pipeline));
     except FTPError:
         return
 
+#asks for deflated transfers; True if the server agreed
+def process_mode_z(ftp_control_connection:socket)->bool:
+    try:
+        writeOutput(send_commands(ftp_control_connection,["MODE Z\r\n"]))
+    except FTPError: #refused, transfers stay as they are
+        return False
+    return True
+
+##############################################################################################
+#                                                                                            # 
+#     Logged-in control connections, kept by the (host, port) they were CONNECTed with.      #
+#     CONNECTing somewhere else parks the current connection here instead of QUITting it, and#
+#     a later CONNECT to the same server picks it back up without logging in again. A        #
+#     background thread NOOPs connections that have sat for KEEPALIVE seconds so the server  #
+#     doesn't time them out, and drops any that stop answering. Pooled connections are only  #
+#     ever used by one side at a time: the loop owns the one it took, the thread only the    #
+#     ones parked here.                                                                      #
+#                                                                                            #
+##############################################################################################
+class PooledSession:
+    def __init__(self,key:tuple[str,int],conn:socket,compressed:bool=False):
+        self.key = key
+        self.conn = conn
+        self.compressed = compressed
+        self.last_used = time.monotonic()
+
+    def alive(self)->bool:
+        #an idle connection has nothing to read unless the server hung up (or said 421 first)
+        try:
+            readable,_,_ = select([self.conn],[],[],0)
+        except (OSError,ValueError):
+            return False
+        return not readable
+
+    def ping(self)->bool:
+        try:
+            list(send_commands(self.conn,["NOOP\r\n"]))
+        except (FTPError,OSError):
+            return False
+        self.last_used = time.monotonic()
+        return True
+
+    def close(self):
+        #QUIT without putting it in the transcript, the script never asked for it
+        try:
+            list(send_commands(self.conn,["QUIT\r\n"]))
+        except (FTPError,OSError):
+            pass
+        self.conn.close()
+
+class SessionPool:
+    def __init__(self,size:int|None=None,keepalive:float|None=None):
+        self.size = POOL_SIZE if size is None else size
+        self.keepalive = KEEPALIVE if keepalive is None else keepalive
+        self.idle:OrderedDict[tuple[str,int],PooledSession] = OrderedDict() #least recently parked first
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread:threading.Thread|None = None
+        self.reused = 0
+
+    def take(self,key:tuple[str,int])->PooledSession|None:
+        with self.lock:
+            session = self.idle.pop(key,None)
+        if session is None:
+            return None
+        if not session.alive():
+            logging.info("pooled connection to %s:%d went away",*key)
+            session.conn.close()
+            return None
+        self.reused += 1
+        logging.info("reusing pooled connection to %s:%d",*key)
+        return session
+
+    def put(self,session:PooledSession):
+        session.last_used = time.monotonic()
+        evicted = []
+        with self.lock:
+            previous = self.idle.pop(session.key,None)
+            if previous is not None: #one per server is plenty
+                evicted.append(previous)
+            self.idle[session.key] = session
+            while len(self.idle) > self.size:
+                evicted.append(self.idle.popitem(last=False)[1])
+            if self.thread is None and self.size > 0:
+                self.thread = threading.Thread(target=self.run,name="keepalive",daemon=True)
+                self.thread.start()
+        for old in evicted:
+            old.close()
+
+    def run(self):
+        while not self.stopped.wait(min(self.keepalive,1.0)):
+            now = time.monotonic()
+            with self.lock:
+                due = [session for session in self.idle.values() if now - session.last_used >= self.keepalive]
+                for session in due: #out of the pool while we talk on it
+                    del self.idle[session.key]
+            for session in due:
+                if session.alive() and session.ping():
+                    with self.lock:
+                        if session.key not in self.idle and not self.stopped.is_set():
+                            self.idle[session.key] = session
+                            continue
+                    session.close()
+                else:
+                    logging.info("dropping pooled connection to %s:%d",*session.key)
+                    session.conn.close()
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        with self.lock:
+            sessions = list(self.idle.values())
+            self.idle.clear()
+        for session in sessions:
+            session.close()
+
+#the address to hand out in PORT: the interface the control connection goes out on, which is the
+#one the server can reach. resolved once per interface
+def local_address(ftp_control_connection:socket)->str:
+    return interface_address(ftp_control_connection.getsockname()[0])
+
+@functools.cache
+def interface_address(interface:str)->str:
+    if interface in ("","0.0.0.0"):
+        return gethostbyname(gethostname())
+    return interface
+
+##############################################################################################
+#                                                                                            # 
+#     Moves one data connection's bytes into a file descriptor, a chunk at a time:           #
+#       recv:      a fresh bytes object per chunk, then written out                          #
+#       recv_into: into one preallocated buffer, written out through a memoryview            #
+#       splice:    socket -> pipe -> file inside the kernel, never through Python (Linux)    #
+#     After MODE Z the data is a zlib stream, inflated a chunk at a time on its way to the   #
+#     file (so never spliced). One Receiver per connection, not shared between threads.      #
+#                                                                                            #
+##############################################################################################
+class Receiver:
+    def __init__(self,mode:str|None=None,chunk:int|None=None,inflate:bool=False):
+        mode = mode or RECV_MODE
+        if mode == "splice" and (inflate or not hasattr(os,"splice")):
+            mode = "recv_into"
+        self.mode = mode
+        self.chunk = chunk or RECV_CHUNK
+        self.inflater = zlib.decompressobj() if inflate else None
+        self.written = 0 #bytes written to the file so far
+        self.view = memoryview(bytearray(self.chunk)) if mode == "recv_into" else None
+        self.pipe = None
+        if mode == "splice":
+            import fcntl #splice is Linux only, and so is this
+            self.pipe = os.pipe()
+            try:
+                fcntl.fcntl(self.pipe[1],fcntl.F_SETPIPE_SZ,self.chunk)
+            except (AttributeError,OSError): #capped by /proc/sys/fs/pipe-max-size, the default still works
+                pass
+
+    def step(self,conn:socket,fd:int,pos:int|None=None)->int:
+        #receives up to one chunk from conn into fd: with pos, written (pwrite) from pos onwards
+        #across calls, else at fd's position. returns the bytes received, 0 means EOF
+        if self.mode == "splice":
+            return self.splice(conn,fd,pos)
+        if self.view is not None:
+            n = conn.recv_into(self.view)
+            data = self.view[:n]
+        else:
+            data = memoryview(conn.recv(self.chunk))
+            n = len(data)
+        if self.inflater is None:
+            self.write(fd,data,pos)
+        elif n == 0:
+            self.write(fd,memoryview(self.inflater.flush()),pos)
+            if not self.inflater.eof:
+                raise ConnectionError("compressed data ended early")
+        else:
+            #at most a chunk of output at a time, however well the data compressed
+            out = self.inflater.decompress(data,self.chunk)
+            while True:
+                self.write(fd,memoryview(out),pos)
+                if not self.inflater.unconsumed_tail:
+                    break
+                out = self.inflater.decompress(self.inflater.unconsumed_tail,self.chunk)
+        return n
+
+    def reset(self):
+        #ready for another connection, keeping the buffer
+        self.written = 0
+        if self.inflater is not None:
+            self.inflater = zlib.decompressobj()
+
+    def write(self,fd:int,data:memoryview,pos:int|None):
+        while data:
+            written = os.write(fd,data) if pos is None else os.pwrite(fd,data,pos + self.written)
+            data = data[written:]
+            self.written += written
+
+    def splice(self,conn:socket,fd:int,pos:int|None)->int:
+        assert self.pipe is not None
+        while True:
+            try:
+                n = os.splice(conn.fileno(),self.pipe[1],self.chunk)
+                break
+            except BlockingIOError: #sockets with a timeout are non-blocking underneath
+                read,_,_ = select([conn],[],[],conn.gettimeout())
+                if not read:
+                    raise TimeoutError("data connection timed out")
+        left = n
+        while left:
+            moved = os.splice(self.pipe[0],fd,left,offset_dst=None if pos is None else pos + self.written)
+            left -= moved
+            self.written += moved
+        return n
+
+    def close(self):
+        if self.pipe is not None:
+            os.close(self.pipe[0])
+            os.close(self.pipe[1])
+            self.pipe = None
+
+##############################################################################################
+#                                                                                            # 
+#     Where a GET's data ends up. The file is written as retr_files/fileN.part, next to      #
+#     fileN.src (the remote pathname, written as soon as the .part is opened), and only      #
+#     renamed to fileN once the server reports success. A failed transfer, or a client      #
+#     killed mid-transfer, leaves both behind, and since the failed GET doesn't use up N,    #
+#     the next GET of the same file resumes it with SIZE + REST.                             #
+#                                                                                            #
+##############################################################################################
+class Download:
+    def __init__(self,file_path:str,num_copied_files:int):
+        self.file_path = file_path
+        self.dest = Path("retr_files")/f"file{num_copied_files}"
+        self.part = self.dest.with_name(self.dest.name + ".part")
+        self.source = self.dest.with_name(self.dest.name + ".src")
+        self.offset = 0
+        self.size:int|None = None #remote size, only asked for when resuming
+        self.f = None
+
+    def restart_commands(self,ftp_control_connection:socket)->list[str]:
+        #the commands that go between PORT/PASV and RETR; nothing unless there's a partial copy to resume
+        if not (self.part.exists() and self.source.exists() and self.source.read_text() == self.file_path):
+            return []
+        have = self.part.stat().st_size
+        comit = send_commands(ftp_control_connection,["SIZE " + self.file_path + "\r\n"])
+        try:
+            writeOutput(next(comit))
+            resp = next(comit)
+            writeOutput(resp)
+            self.size = int(resp.split("Text is: ",1)[1])
+        except (FTPError,IndexError,ValueError):
+            return []
+        if have == 0 or have > self.size: #nothing worth keeping
+            return []
+        self.offset = have
+        return ["REST " + str(have) + "\r\n"]
+
+    def open(self):
+        if self.f is None:
+            self.dest.parent.mkdir(parents=True,exist_ok=True)
+            #the Receiver writes to the fd directly; not O_APPEND, which splice refuses
+            self.f = open(self.part,"r+b" if self.offset else "wb",buffering=0)
+            self.f.seek(self.offset)
+            self.source.write_text(self.file_path) #so even a crash mid-transfer leaves something to resume
+
+    def receive(self,conn:socket,receiver:Receiver)->int:
+        #one chunk from the data connection into the file; 0 once the server has closed it
+        self.open()
+        assert self.f is not None
+        return receiver.step(conn,self.f.fileno())
+
+    def finish(self,response:str)->int:
+        #returns the number of files copied (0 or 1)
+        lines = response.splitlines()
+        ok = len(lines) > 0 and lines[-1].startswith("FTP reply 2") #the reply RETR ended with
+        if self.f is None:
+            if not ok:
+                return 0
+            self.open() #empty file, or a resume that was already complete
+        self.f.close()
+        if not ok:
+            return 0
+        if self.size is not None and self.part.stat().st_size != self.size:
+            writeOutput("GET failed, file size does not match the server's.\n",raw=False)
+            return 0
+        os.replace(self.part,self.dest)
+        self.source.unlink(missing_ok=True)
+        return 1
+
 ##############################################################################################
 #                                                                                            # 
 #     This function is intended to handle processing valid GET commands.                     #
@@ -220,7 +585,7 @@ def process_connect(ftp_control_connection:socket):
 #     then send the PORT/RETR commands to the server and process the received data.          #
 #                                                                                            #
 ##############################################################################################
-def process_get(ftp_control_connection:socket, welcoming_port, file_path, num_copied_files)->int:
+def process_get(ftp_control_connection:socket, welcoming_port, file_path, num_copied_files, compressed:bool=False)->int:
     #TODO: TEST SOCKET OPENING ERRORS - CONFLICTING PORTS
     try:
         dataport = socket()
@@ -231,65 +596,474 @@ def process_get(ftp_control_connection:socket, welcoming_port, file_path, num_co
         writeOutput("GET failed, FTP-data port not allocated.\n",raw=False)
         return 0
     
-    commands = generate_get_output(welcoming_port,file_path)
+    download = Download(file_path,num_copied_files)
+    commands = generate_get_output(welcoming_port,file_path,local_address(ftp_control_connection))
+    commands[1:1] = download.restart_commands(ftp_control_connection)
 
     comit = send_commands(ftp_control_connection,commands)
 
     try:
-        writeOutput(itertools.islice(comit,3));
+        writeOutput(itertools.islice(comit,2*len(commands)-1));
     except FTPError:
         dataport.close()
         return 0
 
-    #ok so: there could be an issue server-side in which the server is unable to write data to the socket
-    #if this happens, the "accept" call will hang.
-    #However, we can see this coming. If we receive data from the control connection,
-    #we should read it using next(comit) and see if it has an error message.
-    #if so, we should abort the connection attempt.
-
-    response = ""
+    #the server either connects to the data port or, if it can't or won't, answers RETR on the
+    #control connection with a final reply (550 straight away, 425 once its connect fails). wait on
+    #both and go with whichever comes first; a connection that's already there wins, its data is
+    #waiting in it. a preliminary 150, which a server may send before it connects, ends nothing:
+    #it's echoed and the wait goes on, for the connection or a final reply after it
+    replies = ReplyReader(ftp_control_connection)
+    response = "" #RETR's final reply
     conn = None
-    while True:
-        try:
-            dataport.settimeout(5)
-            conn,(hostaddr,hostport) = dataport.accept()
-        except TimeoutError:
-            #check if control connection has data
-            read,_,_ = select([ftp_control_connection],[],[],0)
-            if len(read) != 0: #data on the control connection
-                response = next(comit)
-                if "ERROR" in response:
-                    conn = None
-                    break
-            else:
-                continue
-        break
-
-    numcop = 0
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(dataport,selectors.EVENT_READ)
+            selector.register(ftp_control_connection,selectors.EVENT_READ)
+            while conn is None and not response:
+                ready = [] if replies.ready() else [key.fileobj for key,_ in selector.select()]
+                if dataport in ready:
+                    conn,(hostaddr,hostport) = dataport.accept()
+                else:
+                    reply,code = replies.next()
+                    if code >= 200:
+                        response = reply
+    except (OSError,FTPReplyError):
+        dataport.close()
+        return download.finish("")
 
     if conn is not None:
-        dest = Path("retr_files")/f"file{num_copied_files}"
-        dest.parent.mkdir(parents=True,exist_ok=True)
-        with open(dest,"wb") as f:
-            while True:
-
-                data = conn.recv(1024)
-                if len(data) == 0: #connection closed, file done
-                    break
-                f.write(data)
-    
+        receiver = Receiver(inflate=compressed)
+        try:
+            while download.receive(conn,receiver) > 0: #until the connection closes, file done
+                pass
+        except (OSError,zlib.error):
+            pass #short file, the server's reply will say so
+        receiver.close()
         conn.close()
-        numcop = 1
 
     dataport.close()
 
+    try:
+        while not response:
+            reply,code = replies.next()
+            if code >= 200:
+                response = reply
+    except (OSError,FTPReplyError):
+        pass
+
+    return download.finish(response)
+
+
+##############################################################################################
+#                                                                                            # 
+#     Passive-mode GET: the server hands out a data port with PASV, the client connects      #
+#     to it before sending RETR, so no welcoming socket has to be bound for each GET         #
+#     and the server never has to dial back in (which fails behind NAT).                     #
+#                                                                                            #
+##############################################################################################
+def process_get_passive(ftp_control_connection:socket, file_path, num_copied_files, compressed:bool=False)->int:
+    download = Download(file_path,num_copied_files)
+    commands = generate_passive_get_output(file_path)
+    commands[1:1] = download.restart_commands(ftp_control_connection)
+
+    comit = send_commands(ftp_control_connection,commands)
+
+    try:
+        pasv = list(itertools.islice(comit,2))
+        writeOutput(iter(pasv))
+        address = parse_pasv_address(pasv[1],ftp_control_connection)
+        if address is None:
+            next(comit) #raises the FTPError for a refused PASV
+            writeOutput("GET failed, FTP-data port not allocated.\n",raw=False)
+            return 0
+        writeOutput(itertools.islice(comit,2*len(commands)-4)) #REST, if resuming
+    except FTPError:
+        return 0
+
+    try:
+        conn = create_connection(address,timeout=5)
+    except OSError:
+        writeOutput("GET failed, FTP-data connection not established.\n",raw=False)
+        return 0
+
+    writeOutput(itertools.islice(comit,1)) #RETR
+
+    #read the file until the server closes the data connection. The control connection is
+    #only consumed early if the server reports an error before sending anything;
+    #a preliminary 1xx reply waits until the data is drained, so a server that sends
+    #150 before the data can never stall us.
+    response = ""
+    data_open = True
+    watch_control = True
+    receiver = Receiver(inflate=compressed)
+    with conn:
+        while data_open:
+            read,_,_ = select([conn] + ([ftp_control_connection] if watch_control else []),[],[],5)
+            if conn in read:
+                try:
+                    received = download.receive(conn,receiver)
+                except (OSError,zlib.error): #short or garbled, the server's reply will say what happened
+                    received = 0
+                if received == 0: #connection closed, file done
+                    data_open = False
+                    break
+            elif ftp_control_connection in read:
+                if ftp_control_connection.recv(1,MSG_PEEK) == b"1":
+                    watch_control = False
+                else:
+                    response = next(comit)
+                    break
+    receiver.close()
+
     if not response:
         response = next(comit)
 
     writeOutput(response)
 
-    return numcop
+    return download.finish(response)
+
+##############################################################################################
+#                                                                                            # 
+#     Segmented GET: SIZE, then one control connection per byte range, each logging in and  #
+#     sending its own PASV/RANG/RETR. Every range streams over its own data connection at    #
+#     the same time and is pwrite'd straight into its place in a preallocated file; each     #
+#     connection gets its replies in order, so nothing relies on the server answering one    #
+#     command before an earlier RETR is done.                                                #
+#                                                                                            #
+##############################################################################################
+MIN_SEGMENT = 256*1024 #smaller ranges aren't worth another data connection
+
+def process_get_segmented(ftp_control_connection:socket, file_path, num_copied_files, segments:int, compressed:bool=False)->int:
+    comit = send_commands(ftp_control_connection,["SIZE " + file_path + "\r\n"])
+    try:
+        writeOutput(next(comit))
+        resp = next(comit)
+        writeOutput(resp)
+        if not resp.startswith("FTP reply 213"): #the error reply says why
+            return 0
+        size = int(resp.split("Text is: ",1)[1])
+    except FTPError:
+        return 0
+    except (IndexError,ValueError):
+        writeOutput("GET failed, file size not understood.\n",raw=False)
+        return 0
+
+    segments = max(1,min(segments,size//MIN_SEGMENT))
+    if segments == 1: #one range (or none, for an empty file) is just a GET
+        return process_get_passive(ftp_control_connection,file_path,num_copied_files,compressed)
+    bounds = [size*i//segments for i in range(segments+1)]
+    ranges = list(zip(bounds,bounds[1:])) #[start,end)
+    server = ftp_control_connection.getpeername()
+
+    download = Download(file_path,num_copied_files)
+    download.dest.parent.mkdir(parents=True,exist_ok=True)
+    fd = os.open(download.part,os.O_WRONLY|os.O_CREAT|os.O_TRUNC,0o644)
+    try:
+        try:
+            os.posix_fallocate(fd,0,size)
+        except (AttributeError,OSError): #not on this platform/filesystem
+            os.ftruncate(fd,size)
+
+        def fetch(start:int,end:int)->tuple[bool,list[str]]:
+            #one range over its own session; its exchange is returned rather than written, so the
+            #transcript shows each range's whole exchange in turn instead of the threads interleaved
+            transcript = []
+            try:
+                with create_connection(server,timeout=5) as fcc:
+                    setup = [None] + generate_connect_output() + (["MODE Z\r\n"] if compressed else [])
+                    setup += ["PASV\r\n",f"RANG {start} {end-1}\r\n"]
+                    comit = send_commands(fcc,setup + ["RETR " + file_path + "\r\n","QUIT\r\n"])
+                    try:
+                        transcript += itertools.islice(comit,2*len(setup)-3) #up to the PASV reply
+                        address = parse_pasv_address(transcript[-1],fcc)
+                        if address is None:
+                            return False,transcript
+                        receiver = Receiver(inflate=compressed)
+                        try:
+                            with create_connection(address,timeout=5) as conn:
+                                transcript += itertools.islice(comit,3) #RANG, its reply, RETR
+                                while receiver.step(conn,fd,start) > 0:
+                                    pass
+                        finally:
+                            receiver.close()
+                        response = next(comit)
+                        transcript.append(response)
+                        transcript += comit #QUIT
+                    except FTPError:
+                        return False,transcript
+                    return response.splitlines()[-1].startswith("FTP reply 250") and start + receiver.written == end,transcript
+            except (OSError,zlib.error,FTPReplyError):
+                return False,transcript
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            results = list(pool.map(lambda r: fetch(*r),ranges))
+    finally:
+        os.close(fd)
+
+    for ok,transcript in results:
+        writeOutput(iter(transcript))
+    if not all(ok for ok,_ in results):
+        download.part.unlink(missing_ok=True) #no single offset to resume a segmented copy from
+        return 0
+    os.replace(download.part,download.dest)
+    download.source.unlink(missing_ok=True)
+    return 1
+
+#reads replies one line at a time for code that pipelines its own batches, echoing each one
+class ReplyReader:
+    def __init__(self,ftp_control_connection:socket):
+        self.fcc = ftp_control_connection
+        self.buff = ""
+
+    def ready(self)->bool:
+        #a whole reply is already buffered, next() won't touch the socket
+        return "\n" in self.buff
+
+    def next(self)->tuple[str,int]:
+        while "\n" not in self.buff:
+            try:
+                data = self.fcc.recv(1024)
+            except TimeoutError: #left over from send_commands; like it, keep waiting
+                continue
+            if len(data) == 0:
+                raise ConnectionResetError("control connection closed")
+            self.buff += data.decode('utf-8')
+        ind = self.buff.index("\n")+1
+        reply,self.buff = self.buff[:ind],self.buff[ind:]
+        reply,code = parse_reply(reply)
+        if "ERROR" in reply:
+            raise FTPReplyError(reply)
+        writeOutput(reply + os.linesep)
+        return reply,code
+
+##############################################################################################
+#                                                                                            # 
+#     MGET: many files over one control connection. In active mode MGET_WINDOW files go out  #
+#     as one batch, a PORT and a RETR each, and the server dials all of them at once. Its    #
+#     replies come strictly in order: a file's PORT reply, its RETR's 150, and only once     #
+#     that transfer is done its final reply (250, or 425), then the next file's. So every    #
+#     open data connection is drained while waiting for whichever reply is next. In passive #
+#     mode the next file's 227 would wait behind the previous file's final reply, by which   #
+#     time its data port has given up on us: files go one PASV/RETR at a time.               #
+#     Files are numbered retr_files/fileN in request order once their window is done.        #
+#                                                                                            #
+##############################################################################################
+MGET_WINDOW = 8
+
+class MgetTransfer:
+    def __init__(self,path:str,part:Path):
+        self.path = path
+        self.part = part
+        self.listener:socket|None = None #active mode
+        self.conn:socket|None = None
+        self.fd:int|None = None
+        self.receiver:Receiver|None = None
+        self.failed = False
+        self.code:int|None = None #RETR's final reply
+
+    def open(self,conn:socket,receiver:Receiver):
+        receiver.reset()
+        self.conn = conn
+        self.receiver = receiver
+        self.fd = os.open(self.part,os.O_WRONLY|os.O_CREAT|os.O_TRUNC,0o644)
+
+    def close(self):
+        for sock in (self.conn,self.listener):
+            if sock is not None:
+                sock.close()
+        self.conn = self.listener = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+def process_mget(ftp_control_connection:socket, target, num_copied_files, passive:bool=True, compressed:bool=False)->int:
+    if any(c in target for c in "*?["):
+        paths = list_remote(ftp_control_connection,target,passive,compressed)
+        if paths is None:
+            return 0
+    else: #a local file naming one remote path per line
+        try:
+            with open(target) as f:
+                paths = [line.strip() for line in f if line.strip()]
+        except OSError:
+            writeOutput("MGET failed, list-file not readable.\n",raw=False)
+            return 0
+
+    Path("retr_files").mkdir(parents=True,exist_ok=True)
+    window = 1 if passive else MGET_WINDOW
+    receivers = [Receiver(inflate=compressed) for _ in range(min(window,len(paths)))]
+    copied = 0
+    try:
+        for start in range(0,len(paths),window):
+            copied += mget_window(ftp_control_connection,paths[start:start+window],num_copied_files + copied,
+                                  passive,receivers)
+    finally:
+        for receiver in receivers:
+            receiver.close()
+    writeOutput(f"MGET retrieved {copied} of {len(paths)} files.\n",raw=False)
+    return copied
+
+def mget_window(ftp_control_connection:socket, paths:list[str], num_copied_files, passive:bool, receivers:list[Receiver])->int:
+    transfers = [MgetTransfer(path,Path("retr_files")/f"mget{i}.part") for i,path in enumerate(paths)]
+    my_ip = None if passive else local_address(ftp_control_connection)
+    commands = []
+    for t in transfers:
+        if passive:
+            commands.append("PASV\r\n")
+        else:
+            t.listener = socket()
+            t.listener.bind(("",0))
+            t.listener.listen(1)
+            t.listener.setblocking(False)
+            commands.append(port_command(my_ip,t.listener.getsockname()[1]))
+        commands.append("RETR " + t.path + "\r\n")
+    ftp_control_connection.sendall("".join(commands).encode('utf-8'))
+    writeOutput(iter(commands))
+
+    replies = ReplyReader(ftp_control_connection)
+    #the replies still to come, in the order they will: each file's PASV/PORT reply and RETR reply,
+    #with its final reply put next in line when the RETR is accepted
+    expected:deque[tuple[MgetTransfer,str]] = deque((t,stage) for t in transfers for stage in ("data port","retr"))
 
+    try:
+        while True:
+            socks = {(t.conn if t.conn is not None else t.listener):t for t in transfers
+                     if not t.failed and (t.conn is not None or t.listener is not None)}
+            if not expected and not socks:
+                break
+            #data first: by the time a final reply is here, its server has dialed in and the
+            #connection is waiting on the listener, even when the reply was already buffered
+            read = select(([ftp_control_connection] if expected else []) + list(socks),[],[],0 if replies.ready() else 5)[0]
+            if not read and not replies.ready(): #no data moved for a while, give up on what's still open
+                for t in socks.values():
+                    t.failed = True
+                    t.close()
+                continue
+            for sock in read:
+                t = socks.get(sock)
+                if t is None:
+                    continue
+                try:
+                    if t.conn is None: #active mode, the server dialing in
+                        conn,_ = sock.accept()
+                        conn.setblocking(True)
+                        t.listener.close()
+                        t.listener = None
+                        t.open(conn,receivers[transfers.index(t)])
+                    elif t.receiver.step(t.conn,t.fd) == 0:
+                        t.conn.close()
+                        t.conn = None
+                except (OSError,zlib.error):
+                    t.failed = True
+                    t.close()
+            if expected and (replies.ready() or ftp_control_connection in read):
+                reply,code = replies.next()
+                t,stage = expected.popleft()
+                if stage == "data port":
+                    if code >= 400: #no data port, so its RETR gets refused as well
+                        t.failed = True
+                    elif passive:
+                        address = parse_pasv_address(reply,ftp_control_connection)
+                        try:
+                            assert address is not None
+                            t.open(create_connection(address,timeout=5),receivers[transfers.index(t)])
+                        except (AssertionError,OSError):
+                            t.failed = True
+                elif stage == "retr":
+                    if code == 150:
+                        expected.appendleft((t,"final"))
+                    else: #the RETR itself was refused
+                        t.failed = True
+                else:
+                    t.code = code
+                    if t.listener is not None: #never dialed in, and it won't now
+                        t.failed = True
+                if t.failed:
+                    t.close()
+    finally:
+        for t in transfers:
+            t.close()
+
+    copied = 0
+    for t in transfers:
+        if t.failed or t.code != 250:
+            t.part.unlink(missing_ok=True)
+            continue
+        os.replace(t.part,Path("retr_files")/f"file{num_copied_files + copied}")
+        copied += 1
+    return copied
+
+#NLST a glob into a list of names; None if the server wouldn't
+def list_remote(ftp_control_connection:socket, pattern, passive:bool=True, compressed:bool=False)->list[str]|None:
+    listener = None
+    if passive:
+        setup = "PASV\r\n"
+    else:
+        listener = socket()
+        listener.bind(("",0))
+        listener.listen(1)
+        setup = port_command(local_address(ftp_control_connection),listener.getsockname()[1])
+    comit = send_commands(ftp_control_connection,[setup,"NLST " + pattern + "\r\n"])
+    conn = None
+    try:
+        replies = list(itertools.islice(comit,2))
+        writeOutput(iter(replies))
+        if passive:
+            address = parse_pasv_address(replies[1],ftp_control_connection)
+            if address is None:
+                next(comit) #raises the FTPError for a refused PASV
+                return None
+            conn = create_connection(address,timeout=5)
+        writeOutput(next(comit)) #NLST
+        replies = ReplyReader(ftp_control_connection)
+        response = "" #NLST's final reply
+        if listener is not None:
+            #150 may come first; wait for the server to dial in, or for a final reply saying it won't
+            while conn is None:
+                read = [] if replies.ready() else select([listener,ftp_control_connection],[],[],5)[0]
+                if listener in read:
+                    conn,_ = listener.accept()
+                elif not read and not replies.ready(): #nothing for a while
+                    return None
+                else:
+                    reply,code = replies.next()
+                    if code >= 200: #refused
+                        return None
+        listing = bytearray()
+        with conn:
+            while data := conn.recv(65536):
+                listing += data
+        while not response:
+            reply,code = replies.next()
+            if code >= 200:
+                response = reply
+    except (FTPError,FTPReplyError,OSError):
+        return None
+    finally:
+        if listener is not None:
+            listener.close()
+    if not response.splitlines()[-1].startswith("FTP reply 2"):
+        return None
+    if compressed:
+        listing = zlib.decompress(listing)
+    return [name for name in listing.decode('utf-8').split("\r\n") if name]
+
+def port_command(my_ip:str,port:int)->str:
+    return "PORT " + my_ip.replace(".",",") + f",{port//256},{port%256}\r\n"
+
+# 227 Entering Passive Mode (h1,h2,h3,h4,p1,p2)
+def parse_pasv_address(resp:str,ftp_control_connection:socket)->tuple[str,int]|None:
+    if not resp.startswith("FTP reply 227"):
+        return None
+    match = re.search(r"\((\d+),(\d+),(\d+),(\d+),(\d+),(\d+)\)",resp)
+    if match is None:
+        return None
+    nums = list(map(int,match.groups()))
+    host = ".".join(map(str,nums[:4]))
+    if host == "0.0.0.0": #server doesn't know its own address, use the one we reached it on
+        host = ftp_control_connection.getpeername()[0]
+    return host,nums[4]*256 + nums[5]
 
 ##############################################################################################
 #                                                                                            # 
@@ -316,8 +1090,9 @@ def generate_connect_output():
                       "TYPE I\r\n"]
     return connect_commands
 
-def generate_get_output(port_num, file_path):
-    my_ip = gethostbyname(gethostname())
+def generate_get_output(port_num, file_path, my_ip=None):
+    if my_ip is None:
+        my_ip = interface_address("")
     # my_ip = "100.108.232.98" #tailscale connection, buster's IP for laptop
 
     FTP_ip = my_ip.replace(".",",")
@@ -331,6 +1106,14 @@ def generate_get_output(port_num, file_path):
 
     return get_commands
 
+def generate_passive_get_output(file_path):
+    get_commands = [
+        "PASV\r\n",
+        "RETR " + file_path + "\r\n",
+    ]
+
+    return get_commands
+
 ##############################################################
 #         Any method below this point is for parsing         #
 ##############################################################
@@ -386,6 +1169,21 @@ def parse_get(command):
         return "ERROR -- <CRLF>",""
     return f"GET accepted for {pathname}", pathname
 
+# MGET<SP>+<pathname><EOL>, the pathname being a glob or a local list-file
+def parse_mget(command):
+    if command[0:4] != "MGET":
+        return "ERROR -- request",""
+    command = command[4:]
+    
+    command = parse_space(command)
+    command, pathname = parse_pathname(command)
+
+    if "ERROR" in command:
+        return command,""
+    elif command != '\r\n' and command != '\n':
+        return "ERROR -- <CRLF>",""
+    return f"MGET accepted for {pathname}", pathname
+
 # QUIT<EOL>
 def parse_quit(command):
     if command != "QUIT\r\n" and command != "QUIT\n":
@@ -421,22 +1219,8 @@ def parse_server_port(command):
     return command[len(port_nums):], port_string
 
 # <pathname> ::= <string>
-# <string> ::= <char> | <char><string>
-# <char> ::= any one of the 128 ASCII characters
 def parse_pathname(command):
-    pathname = ""
-    if command[0] == '\n' or command[0:2] == '\r\n':
-        return "ERROR -- pathname", pathname
-    else:
-        while len(command) > 1:
-            if len(command) == 2 and command[0:2] == '\r\n':
-                return command, pathname
-            elif ord(command[0]) >= ascii_codes["min_ascii_val"] and ord(command[0]) <= ascii_codes["max_ascii_val"]:
-                pathname += command[0]
-                command = command[1:]
-            else:
-                return "ERROR -- pathname", pathname
-        return command, pathname
+    return parse_string(command,"ERROR -- pathname")
 
 # <domain> ::= <element> | <element>"."<domain>
 def parse_domain(command):
@@ -444,50 +1228,54 @@ def parse_domain(command):
     return command, server_host
 
 # <element> ::= <a><let-dig-hyp-str>
+# walks the elements with an index into command, so nothing is copied until the end
 def parse_element(command, element_string=""):
-    # Keep track of all elements delimited by "." to return to calling function
-
-    # Ensure first character is a letter
-    if (ord(command[0]) >= ascii_codes["A"] and ord(command[0]) <= ascii_codes["Z"]) \
-    or (ord(command[0]) >= ascii_codes["a"] and ord(command[0]) <= ascii_codes["z"]):
-        element_string += command[0]
-        command, let_dig_string = parse_let_dig_str(command[1:])
-        element_string += let_dig_string
-        if command[0] == ".":
-            element_string += "."
-            return parse_element(command[1:], element_string)
-        elif command[0] == ' ':
-            return command, element_string
-        else:
-            return "ERROR", element_string
-    elif command[0] == ' ':
-        return command, element_string
-    return "ERROR", element_string
+    pos = 0
+    while True:
+        char = command[pos]
+        if char.isascii() and char.isalpha():
+            command[pos+1] #a letter ending the line is an IndexError, as it always was
+            pos = LET_DIG_HYP.match(command,pos+1).end()
+            if pos == len(command):
+                return "ERROR", element_string + command
+            char = command[pos]
+            if char == ".":
+                pos += 1
+                continue
+        if char == ' ': #the domain ends here (even right after a ".")
+            return command[pos:], element_string + command[:pos]
+        return "ERROR", element_string + command[:pos]
 
 # <let-dig-hyp-str> ::= <let-dig-hyp> | <let-dig-hyp><let-dig-hyp-str>
 # <a> ::= any one of the 52 alphabetic characters "A" through "Z"in upper case and "a" through "z" in lower case
 # <d> ::= any one of the characters representing the ten digits 0 through 9
 def parse_let_dig_str(command):
-    let_dig_string = ""
-    while (ord(command[0]) >= ascii_codes["A"] and ord(command[0]) <= ascii_codes["Z"]) \
-    or (ord(command[0]) >= ascii_codes["a"] and ord(command[0]) <= ascii_codes["z"]) \
-    or (ord(command[0]) >= ascii_codes["0"] and ord(command[0]) <= ascii_codes["9"]) \
-    or (ord(command[0]) == ord('-')):
-        let_dig_string += command[0]
-        if len(command) > 1:
-            command = command[1:]
-        else:
-            return command, let_dig_string
-    return command, let_dig_string
+    command[0] #nothing to scan is an IndexError, as it always was
+    end = LET_DIG_HYP.match(command).end()
+    if end == len(command): #the last character stays behind as the remainder
+        return command[-1:], command
+    return command[end:], command[:end]
 
 # <SP>+ ::= one or more space characters
 def parse_space(line):
     if line[0] != ' ':
         return "ERROR"
-    while line[0] == ' ':
-        line = line[1:]
+    line = line.lstrip(' ')
+    line[0] #a line of nothing but spaces is an IndexError, as it always was
     return line
 
+# <string> ::= <char> | <char><string>
+# <char> ::= any one of the 128 ASCII characters
+# runs to the <CRLF> at the end of the line, or up to its last character if there isn't one
+def parse_string(line, error):
+    if line[0] == '\n' or line[0:2] == '\r\n':
+        return error, ""
+    end = len(line) - 2 if line.endswith('\r\n') else len(line) - 1
+    bad = NON_ASCII.search(line,0,end)
+    if bad is not None:
+        return error, line[:bad.start()]
+    return line[end:], line[:end]
+
 
 #############################################
 #    Any method below this point is for     #
@@ -495,7 +1283,7 @@ def parse_space(line):
 #############################################
 # <reply-code><SP><reply-text><CRLF> 
 def parse_reply(reply):
-    logging.info("parsing FTP reply:\n" + reply)
+    logging.info("parsing FTP reply:\n%s",reply)
     # <reply-code>
     reply, reply_code = parse_reply_code(reply)
     if "ERROR" in reply:
@@ -538,24 +1326,35 @@ def parse_reply_number(reply:str):
     return reply[3:], reply_number
 
 # <reply-text> ::= <string>
-# <string> ::= <char> | <char><string>
-# <char> ::= any one of the 128 ASCII characters
 def parse_reply_text(reply):
-    reply_text = ""
-    if reply[0] == '\n' or reply[0:2] == '\r\n':
-        return "ERROR -- reply_text", reply_text
-    else:
-        while len(reply) > 1:
-            if len(reply) == 2 and reply[0:2] == '\r\n':
-                return reply, reply_text
-            elif ord(reply[0]) >= ascii_codes["min_ascii_val"] and ord(reply[0]) <= ascii_codes["max_ascii_val"]:
-                reply_text += reply[0]
-                reply = reply[1:]
-            else:
-                return "ERROR -- reply_text", reply_text
-        return reply, reply_text
+    return parse_string(reply,"ERROR -- reply_text")
 
 if __name__ == "__main__":
 
-    logging.basicConfig(filename='client.log', level=logging.INFO,filemode='w')
-    read_commands()
+    import argparse
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("port",type=int,help="first welcoming port for FTP-data connections")
+    argparser.add_argument("--pipeline",action="store_true",help="send the USER/PASS/SYST/TYPE login sequence as one batch")
+    argparser.add_argument("--log-level",choices=LEVELS,default="INFO")
+    argparser.add_argument("--log-sample",type=int,default=1,metavar="N",help="only log 1 in N records below WARNING")
+    argparser.add_argument("--active",action="store_true",help="GET with PORT (server connects back) instead of PASV")
+    argparser.add_argument("--recv-mode",choices=RECV_MODES,default=RECV_MODE,help="how GET data reaches disk; splice is Linux only")
+    argparser.add_argument("--recv-chunk",type=int,default=RECV_CHUNK//1024,metavar="KB",help="receive chunk size, 64-4096 KB")
+    argparser.add_argument("--mode-z",action="store_true",help="ask the server to deflate transfers (MODE Z) after logging in")
+    argparser.add_argument("--mget-window",type=int,default=MGET_WINDOW,metavar="N",help="files MGET keeps in flight at once")
+    argparser.add_argument("--pool-size",type=int,default=POOL_SIZE,metavar="N",help="idle control connections kept for reuse (e.g. 4); 0, the default, QUITs on every CONNECT")
+    argparser.add_argument("--keepalive",type=float,default=KEEPALIVE,metavar="SECONDS",help="NOOP pooled connections idle this long")
+    argparser.add_argument("--segments",type=int,default=1,metavar="N",help="split each passive GET into N byte ranges fetched in parallel")
+    add_transcript_arguments(argparser)
+    args = argparser.parse_args()
+    if not 64 <= args.recv_chunk <= 4096:
+        argparser.error("--recv-chunk must be between 64 and 4096 KB")
+
+    setup_logging('client.log',args.log_level,sample=args.log_sample)
+    TRANSCRIPT = transcript_from_arguments(args)
+    RECV_MODE = args.recv_mode
+    RECV_CHUNK = args.recv_chunk*1024
+    MGET_WINDOW = args.mget_window
+    POOL_SIZE = args.pool_size
+    KEEPALIVE = args.keepalive
+    read_commands(args.port,pipeline=args.pipeline,passive=not args.active,segments=args.segments,mode_z=args.mode_z)
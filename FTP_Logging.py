@@ -0,0 +1,76 @@
+#logging setup shared by FTP_Server.py and FTP_Client.py
+#records are handed to a queue and formatted and written to the log file by a background thread,
+#so the protocol loop never waits on disk; optional sampling thins out the INFO chatter
+
+import atexit
+import itertools
+import logging
+import logging.handlers
+import queue
+
+LEVELS = ["DEBUG","INFO","WARNING","ERROR","OFF"]
+
+class SampleFilter(logging.Filter):
+    #lets through 1 in every `every` records below WARNING; warnings and errors always pass
+    def __init__(self,every:int):
+        super().__init__()
+        self.every = every
+        self.counter = itertools.count()
+
+    def filter(self,record:logging.LogRecord)->bool:
+        return record.levelno >= logging.WARNING or next(self.counter) % self.every == 0
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    #the stock prepare() formats the message and copies the record so it can be pickled, on the
+    #logging thread; this queue never leaves the process, so the record goes in as it is and the
+    #listener's FileHandler does all the formatting on its own thread
+    def prepare(self,record:logging.LogRecord)->logging.LogRecord:
+        return record
+
+class LogPipeline:
+    def __init__(self,handler:logging.Handler,listener:logging.handlers.QueueListener|None=None,file_handler:logging.Handler|None=None):
+        self.handler = handler
+        self.listener = listener
+        self.file_handler = file_handler
+
+    def stop(self):
+        #flushes anything still queued; safe to call more than once
+        logging.getLogger().removeHandler(self.handler)
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        if self.file_handler is not None:
+            self.file_handler.close()
+
+def setup_logging(filename:str,level:str="INFO",background:bool=True,sample:int=1,filemode:str='w')->LogPipeline:
+    #none of our formats use these, so don't pay to collect them for every record
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    if level == "OFF":
+        root.setLevel(logging.CRITICAL + 1)
+        handler = logging.NullHandler()
+        root.addHandler(handler)
+        return LogPipeline(handler)
+
+    file_handler = logging.FileHandler(filename,mode=filemode)
+    file_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT)) #same lines basicConfig writes
+
+    listener = None
+    if background:
+        records:queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        handler:logging.Handler = LocalQueueHandler(records)
+        listener = logging.handlers.QueueListener(records,file_handler)
+        listener.start()
+    else:
+        handler = file_handler
+    if sample > 1:
+        handler.addFilter(SampleFilter(sample))
+
+    root.addHandler(handler)
+    root.setLevel(level)
+    pipeline = LogPipeline(handler,listener,file_handler)
+    atexit.register(pipeline.stop)
+    return pipeline
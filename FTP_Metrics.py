@@ -0,0 +1,156 @@
+#live numbers for the server: commands by verb, error replies by code, bytes sent, and histograms of
+#transfer time, transfer throughput and command latency (from a line being parsed to its reply being ready).
+#recording is a lock, a dict increment and a bisect, cheap enough to leave on; reading them out goes
+#through the STAT command or, with --metrics-port, a localhost HTTP endpoint in Prometheus text format
+
+from bisect import bisect_left
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+from typing import Callable
+
+def log_buckets(low:float,high:float,steps=(1,2.5,5))->list[float]:
+    #1, 2.5, 5, 10, 25, ... from low up to high
+    bounds = []
+    scale = low
+    while scale <= high:
+        bounds += [scale*step for step in steps if scale*step <= high]
+        scale *= 10
+    return bounds
+
+class Histogram:
+    def __init__(self,bounds:list[float]):
+        self.bounds = bounds #upper bounds; one more bucket past the last for everything bigger
+        self.counts = [0]*(len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self,value:float):
+        self.counts[bisect_left(self.bounds,value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self,q:float)->float:
+        #estimated the way Prometheus' histogram_quantile does: linear within the bucket it lands in
+        if self.count == 0:
+            return 0.0
+        rank = q*self.count
+        seen = 0
+        for i,count in enumerate(self.counts):
+            if seen + count >= rank and count > 0:
+                if i == len(self.bounds): #past the last bound, all we know is it's at least that
+                    return self.bounds[-1]
+                low = self.bounds[i-1] if i > 0 else 0.0
+                return low + (self.bounds[i] - low)*(rank - seen)/count
+            seen += count
+        return self.bounds[-1]
+
+    def prometheus(self,name:str,help:str)->list[str]:
+        lines = [f"# HELP {name} {help}",f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound,count in zip(self.bounds,self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.sum:g}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+class Metrics:
+    def __init__(self,verbs:"set[str]|None"=None,counters:"Callable[[],dict[str,int]]|None"=None):
+        self.verbs = verbs #anything else is counted as "other", so junk commands can't grow the table
+        self.counters = counters #more running totals to report (the server's session counts)
+        self.lock = threading.Lock()
+        self.commands:Counter[str] = Counter()
+        self.errors:Counter[int] = Counter()
+        self.bytes_sent = 0
+        self.command_seconds = Histogram(log_buckets(1e-6,10))
+        self.transfer_seconds = Histogram(log_buckets(1e-3,1000))
+        self.transfer_rate = Histogram(log_buckets(1e3,1e10)) #bytes/s
+
+    def command(self,verb:str,seconds:float,code:int):
+        #the control loop, once per line
+        if self.verbs is not None and verb not in self.verbs:
+            verb = "other"
+        histogram = self.command_seconds #observe() inlined, this runs for every command
+        with self.lock:
+            self.commands[verb] += 1
+            histogram.counts[bisect_left(histogram.bounds,seconds)] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+            if code >= 400:
+                self.errors[code] += 1
+
+    def transfer(self,seconds:float,sent:int,code:int|None=None):
+        #a transfer thread, once per RETR; code is the error reply's if it failed
+        with self.lock:
+            self.bytes_sent += sent
+            self.transfer_seconds.observe(seconds)
+            if sent and seconds > 0:
+                self.transfer_rate.observe(sent/seconds)
+            if code is not None:
+                self.errors[code] += 1
+
+    def status_lines(self)->list[str]:
+        #for STAT: one line per subject, every latency in milliseconds
+        def percentiles(histogram:Histogram,scale:float,digits:int)->str:
+            return " ".join(f"p{int(q*100)}={histogram.quantile(q)*scale:.{digits}f}" for q in (0.5,0.9,0.99))
+        with self.lock:
+            lines = []
+            if self.counters is not None:
+                lines.append("server " + " ".join(f"{name}={value}" for name,value in self.counters().items()))
+            lines.append("commands " + (" ".join(f"{verb}={count}" for verb,count in sorted(self.commands.items())) or "none"))
+            lines.append("errors " + (" ".join(f"{code}={count}" for code,count in sorted(self.errors.items())) or "none"))
+            lines.append(f"transfers count={self.transfer_seconds.count} bytes_sent={self.bytes_sent}")
+            lines.append("transfer_ms " + percentiles(self.transfer_seconds,1e3,1))
+            lines.append("transfer_MBps " + percentiles(self.transfer_rate,1e-6,1))
+            lines.append("command_ms " + percentiles(self.command_seconds,1e3,3))
+        return lines
+
+    def prometheus(self)->str:
+        with self.lock:
+            lines = []
+            if self.counters is not None:
+                for name,value in self.counters().items():
+                    if name.startswith("open_"): #the only one that goes down
+                        lines += [f"# TYPE ftp_server_{name} gauge",f"ftp_server_{name} {value}"]
+                    else:
+                        lines += [f"# TYPE ftp_server_{name}_total counter",f"ftp_server_{name}_total {value}"]
+            lines += ["# HELP ftp_commands_total Commands received, by verb.","# TYPE ftp_commands_total counter"]
+            lines += [f'ftp_commands_total{{verb="{verb}"}} {count}' for verb,count in sorted(self.commands.items())]
+            lines += ["# HELP ftp_errors_total Error replies sent, by code.","# TYPE ftp_errors_total counter"]
+            lines += [f'ftp_errors_total{{code="{code}"}} {count}' for code,count in sorted(self.errors.items())]
+            lines += ["# HELP ftp_sent_bytes_total File bytes sent over data connections.","# TYPE ftp_sent_bytes_total counter",
+                      f"ftp_sent_bytes_total {self.bytes_sent}"]
+            lines += self.transfer_seconds.prometheus("ftp_transfer_seconds","Time from a transfer starting to its data being sent.")
+            lines += self.transfer_rate.prometheus("ftp_transfer_bytes_per_second","Throughput of each transfer.")
+            lines += self.command_seconds.prometheus("ftp_command_seconds","Time from a command being parsed to its reply being ready.")
+        return "\n".join(lines) + "\n"
+
+#GET /metrics on a localhost port, served from its own threads
+class MetricsEndpoint:
+    def __init__(self,metrics:Metrics,port:int,host:str="127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type","text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length",str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self,*args): #not into the server's stderr
+                pass
+
+        self.httpd = ThreadingHTTPServer((host,port),Handler)
+        self.httpd.daemon_threads = True
+        self.port:int = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever,name="metrics",daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
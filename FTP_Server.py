@@ -1,19 +1,38 @@
-from dataclasses import dataclass
+import argparse
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from enum import Enum
 import functools
+import glob
+import heapq
+import io
+import json
 import logging
 import os
 from pathlib import Path
-import re
+import selectors
 import shutil
+import signal
+import queue
 import socket
+import string
+import sys
+import threading
 import time
-from typing import Callable, Literal
+from typing import BinaryIO, Callable, Generator, Iterable, Iterator, Literal
+import zlib
 
+from FTP_Logging import LEVELS, setup_logging
+from FTP_Metrics import Metrics, MetricsEndpoint
+from FTP_Transcript import StdoutTranscript, add_transcript_arguments, transcript_from_arguments
+
+log = logging.getLogger() #for level checks before building expensive log messages
 
 RETR_OUT = Path("retr_files")
 
-### ALL STATE SHOULD BE STORED IN THE GLOABL SERVER_STATE VARIABLE
+### ALL PROTOCOL STATE IS STORED PER-SESSION: every parser gets the ServerState of the
+### connection (or stdin stream) it is parsing for, so any number of sessions can run at once
 
 @dataclass
 class ServerState:
@@ -22,6 +41,9 @@ class ServerState:
     USERNAME:bool = False
     PASSWORD:bool = False
     PORT_OPEN:bool = False
+    REST_OFFSET:int = 0 #where the next RETR starts, set by REST or RANG
+    REST_END:int|None = None #and where it stops (exclusive), only set by RANG
+    MODE:str = "S" #transfer mode: S(tream) sends the file as is, Z deflates it
 
     def reset_state(self):
         self.NUM_RETRD = 0
@@ -29,11 +51,15 @@ class ServerState:
         self.USERNAME = False
         self.PASSWORD = False
         self.PORT_OPEN = False
+        self.REST_OFFSET = 0
+        self.REST_END = None
+        self.MODE = "S"
 
+    def __str__(self):
+        #compact summary for the logs, the full repr drags in socket objects
+        return f"user={self.USERNAME:d} pass={self.PASSWORD:d} port={self.PORT_OPEN:d} active={self.ACTIVE:d} retrd={self.NUM_RETRD}"
 
 
-SERVER_STATE:ServerState
-
 CR = "\r"
 LF = "\n"
 
@@ -42,14 +68,30 @@ replies:dict[int|tuple[int,...],str|dict[str|None,str]] = {
     200:{
         None:"200 Command OK.\r\n",
         "TYPE":"200 Type set to {type}.\r\n",
+        "MODE":"200 Mode set to {mode}.\r\n",
         "PORT":"200 Port command successful ({address},{port}).\r\n"
     },
+    211:{
+        None:"211-FTP server status:\r\n", #the numbers go between these two, one per line
+        "END":"211 End of status.\r\n"
+    },
+    213:"213 {size}\r\n",
     215:"215 UNIX Type: L8.\r\n",
     220:"220 COMP 431 FTP server ready.\r\n",
     221:"221 Goodbye.\r\n",
+    227:"227 Entering Passive Mode ({address}).\r\n",
+    229:"229 Entering Extended Passive Mode (|||{port}|).\r\n",
     230:"230 Guest login OK.\r\n",
     250:"250 Requested file action completed.\r\n",
     331:"331 Guest access OK, send password.\r\n",
+    350:{
+        "REST":"350 Restarting at {offset}. Send RETR to initiate transfer.\r\n",
+        "RANG":"350 Restarting at {offset}. End byte range at {end}.\r\n"
+    },
+    421:{
+        None:"421 Too many sessions, try again later.\r\n",
+        "IDLE":"421 Idle too long, closing control connection.\r\n"
+    },
     425:"425 Can not open data connection.\r\n", 
     500:"500 Syntax error, command unrecognized.\r\n",
     501:"501 Syntax error in parameter.\r\n",
@@ -59,8 +101,32 @@ replies:dict[int|tuple[int,...],str|dict[str|None,str]] = {
 }
 replies[(150,425)] = replies[150] + replies[425] #dirty hack lmfao
 
+#replies go out as bytes, so every template is split once at import into literal byte chunks
+#and the names of its fields; static replies collapse into a single pre-encoded chunk
+ReplyTemplate = tuple[tuple[bytes,str|None],...]
+
+def compile_template(template:str,args:dict[str,str]={})->ReplyTemplate:
+    parts:list[tuple[bytes,str|None]] = []
+    literal = ""
+    for text,field_name,_,_ in string.Formatter().parse(template):
+        literal += text
+        if field_name is None:
+            continue
+        if field_name in args: #static argument, bake it in
+            literal += args[field_name]
+            continue
+        parts.append((literal.encode('utf-8'),field_name))
+        literal = ""
+    parts.append((literal.encode('utf-8'),None))
+    return tuple(parts)
+
+def build_reply(template:ReplyTemplate,kwargs:dict[str,str])->bytes:
+    if len(template) == 1:
+        return template[0][0]
+    return b"".join([literal + kwargs[name].encode('utf-8') if name is not None else literal for literal,name in template])
+
 class FTPAction:
-    def __init__(self,reply:str,callback:Callable[[],None]|None=None):
+    def __init__(self,reply:bytes,callback:Callable[[],None]|None=None):
         self.reply = reply
         self.callback = callback
 
@@ -76,10 +142,12 @@ class FTPError(Exception,Enum):
     not_logged_in = 530
     file_error = 550
     file_ok_bad_transfer = ((150,425),)
+    bad_transfer = 425 #a background transfer's final reply, its 150 went out when it was accepted
 
     def __init__(self,value:int):
         self.val = value
         super().__init__(self.reply());
+        self.data = self.reply().encode('utf-8')
         
     def reply(self)->str:
         return replies[self.val]
@@ -96,14 +164,30 @@ class FTPReply(Enum):
     command_ok = 200
     type_I = (200,"TYPE",{"type":"I"})
     type_A = (200,"TYPE",{"type":"A"})
+    mode_S = (200,"MODE",{"mode":"S"})
+    mode_Z = (200,"MODE",{"mode":"Z"})
     port_success = (200,"PORT")
     system = 215
     file_completed = 250
+    passive = 227
+    extended_passive = 229
+    file_size = 213
+    status = 211
+    status_end = 211,"END"
+    restart = 350,"REST"
+    byte_range = 350,"RANG"
+    busy = 421
+    idle = 421,"IDLE"
 
     def __init__(self,value:int,command:str|None=None,args:dict[str,str]={}):
         self.val = value
         self.command = command
         self.args = args
+        rep = replies[self.val];
+        if isinstance(rep,dict):
+            rep = rep[self.command];
+        self.template = compile_template(rep,args)
+        self.data = self.template[0][0] if len(self.template) == 1 else None #pre-encoded static reply
         
     def reply(self,**kwargs)->str:
         rep = replies[self.val];
@@ -117,163 +201,186 @@ class FTPReply(Enum):
     def __call__(self,*args,**kwargs):
         return self.reply(*args,**kwargs)
 
-    def bytes(self,encoding:str='utf-8',*args,**kwargs):
-        return self.reply(*args,**kwargs).encode(encoding=encoding)
+    def bytes(self,**kwargs):
+        if self.data is not None:
+            return self.data
+        return build_reply(self.template,kwargs)
+
+RETR_OK = FTPReply.file_ok.bytes() + FTPReply.file_completed.bytes()
+#a transfer run in the background answers in two halves: 150 when it's accepted, 250 when it's done
+TRANSFER_STARTED = FTPReply.file_ok.bytes()
+TRANSFER_DONE = FTPReply.file_completed.bytes()
 
 
-def parseCommand(command:str,include_command=True):
-    reply = ""
+def parseCommand(state:ServerState,command:str,include_command=True)->bytes:
+    reply = b""
     nextline = command
+    trace = log.isEnabledFor(logging.DEBUG) #one level check for the step-by-step trace
     try:
-        if include_command: reply += nextline + "\n"
+        if include_command: reply += (nextline + "\n").encode('utf-8')
 
         #parse end-of-line
-        if not nextline.endswith("\r"):
+        end = len(nextline) - 1
+        if end < 0 or nextline[end] != "\r":
             raise FTPError.invalid_parameter
-        else:
-            nextline = nextline.removesuffix("\r")
 
-        #parse command token
-        comm_idx = re.search(" ",nextline)
-        if comm_idx == None:
-            comm_idx = len(nextline)
-        else:
-            comm_idx = comm_idx.start()
-        comm = nextline[:comm_idx].upper()
-        logging.info("parsing command token: '" + comm + "'")
-        if comm not in parsers: #invalid command token
+        #parse command token (canonical upper-case verbs skip the .upper() copy)
+        comm_idx = nextline.find(" ",0,end)
+        if comm_idx == -1:
+            comm_idx = end
+        comm = nextline[:comm_idx]
+        spec = commands.get(comm)
+        if spec is None:
+            comm = comm.upper()
+            spec = commands.get(comm)
+        if trace: logging.debug("parsing command token: '%s'",comm)
+        if spec is None: #invalid command token
             logging.error("No Command")
             raise FTPError.invalid_command
             
         #parse command
-        logging.info("parsing command: " + nextline)
-        nextline = nextline[comm_idx:]
-        command_action = parsers[comm](nextline)
-        if isinstance(command_action,str):
-            command_action = FTPAction(command_action);
-        
-        logging.info("command parsed successfully")
+        if trace: logging.debug("parsing command: %s",nextline)
+        result = spec.parse(state,nextline[comm_idx:end])
+        if trace: logging.debug("command parsed successfully")
 
         #command valid, validate command order
-        logging.info(SERVER_STATE)
-        if not SERVER_STATE.USERNAME and comm != 'USER':
-            #valid command preceding valid USER+PASS sequence
-            raise FTPError.not_logged_in
-        elif not SERVER_STATE.PASSWORD and comm not in ['USER','PASS']:
-            SERVER_STATE.USERNAME = False #consumes USER
-            #valid command preceding valid USER+PASS sequence
-            raise FTPError.not_logged_in
-        elif comm == 'RETR' and not SERVER_STATE.PORT_OPEN:
-            raise FTPError.bad_order
-        
-        logging.info("command is valid to execute")
+        logging.info("session state: %s",state)
+        check_order(state,spec.requires)
+        if trace: logging.debug("command is valid to execute")
         
         #if command is valid, execute it
-        command_action.execute()
-        if comm == 'PORT':
-            SERVER_STATE.PORT_OPEN = True
-        if comm == 'RETR':
-            SERVER_STATE.PORT_OPEN = False
+        if isinstance(result,FTPAction):
+            result.execute()
+            result = result.reply
 
         #if execution is valid, record command
-        if comm == 'USER':
-            logging.info("Username Recorded")
-            SERVER_STATE.USERNAME = True
-            SERVER_STATE.PASSWORD = False
-        if comm == 'PASS':
-            logging.info("Password Recorded")
-            SERVER_STATE.PASSWORD = True
+        for flag,value in spec.sets:
+            setattr(state,flag,value)
 
         #finally, reply
-        reply += command_action.reply
-        logging.info("command executed successfully")
+        reply += result
+        if trace: logging.debug("command executed successfully")
     except FTPError as f:
-        logging.error("FTP Error: " + f.reply())
-        reply += f.reply()
+        f.__traceback__ = None #the members are singletons, and every raise would stack its frames onto the last
+        logging.error("FTP Error: %s",f.reply())
+        reply += f.data
    
     return reply
 
+def check_order(state:ServerState,requires:"Requires"):
+    if requires is Requires.nothing:
+        return
+    if not state.USERNAME:
+        #valid command preceding valid USER+PASS sequence
+        raise FTPError.not_logged_in
+    if requires is Requires.username:
+        return
+    if not state.PASSWORD:
+        state.USERNAME = False #consumes USER
+        #valid command preceding valid USER+PASS sequence
+        raise FTPError.not_logged_in
+    if requires is Requires.port and not state.PORT_OPEN:
+        raise FTPError.bad_order
 
 
 
 
-def parseCommands(commands:str):
+
+#local mode: one session's commands in, its transcript out, a line at a time.
+#lines come with their "\n" (as from iterating a file), so a replay of any length streams through
+def serveCommands(state:ServerState,lines:Iterable[str])->Iterator[bytes]:
     logging.info("beginning command parsing")
-    reply:str = FTPReply.server_ok()
-    
-    while True:
-        if not SERVER_STATE.ACTIVE or commands == "":
+    yield FTPReply.server_ok.bytes()
+
+    for line in lines:
+        if not state.ACTIVE:
             break
-        try:
-            #get line
-            idx = re.search("\n",commands)
-            if idx == None:
-                reply += commands
-                commands = ""
-                SERVER_STATE.ACTIVE = False
-                logging.error("No CRLF")
-                raise FTPError.invalid_parameter
-            idx = idx.start()
-            nextline,commands = commands[:idx],commands[idx+1:]
-            
-            reply += parseCommand(nextline)
-        except FTPError as f:
-            logging.error("FTP Error: " + f.reply())
-            reply += f.reply()
-            continue
+        if not line.endswith("\n"): #input ran out mid-line
+            state.ACTIVE = False
+            logging.error("No CRLF")
+            logging.error("FTP Error: %s",FTPError.invalid_parameter.reply())
+            yield line.encode('utf-8') + FTPError.invalid_parameter.data
+            break
+        yield parseCommand(state,line[:-1])
 
+def parseCommands(state:ServerState,commands:str)->bytes:
+    return b"".join(serveCommands(state,io.StringIO(commands,newline="\n"))) #split on "\n" only
 
-    return reply
 
 
+def is_printable(text:str)->bool:
+    #same as re.fullmatch("[ -~]+",text): non-empty and nothing outside ASCII 32-126
+    return text != "" and text.isascii() and text.isprintable()
 
-def parseUser(command:str):
+def parseUser(state:ServerState,command:str)->bytes:
     command = command.lstrip(" ")
-    username = re.fullmatch("[ -~]+",command)
-    if username is None:
+    if not is_printable(command):
         raise FTPError.invalid_parameter
     else:
-        return FTPReply.guest_ok()
+        return FTPReply.guest_ok.bytes()
 
-def parsePass(command:str)->str:
+def parsePass(state:ServerState,command:str)->bytes:
     command = command.lstrip(" ")
-    password = re.fullmatch("[ -~]+",command)
-    if password is None:
+    if not is_printable(command):
         raise FTPError.invalid_parameter
     else:
-        return FTPReply.guest_login()
+        return FTPReply.guest_login.bytes()
 
-def parseType(command:str)->str:
+def parseType(state:ServerState,command:str)->bytes:
     command = command.lstrip(" ")
     if command == "I":
-        return FTPReply.type_I();
+        return FTPReply.type_I.bytes();
     elif command == "A":
-        return FTPReply.type_A();
+        return FTPReply.type_A.bytes();
     else:
         raise FTPError.IP;
 
-def parseSyst(command:str)->str:
+def parseMode(state:ServerState,command:str)->FTPAction:
+    command = command.lstrip(" ").upper()
+    if command == "S":
+        reply = FTPReply.mode_S.bytes()
+    elif command == "Z":
+        reply = FTPReply.mode_Z.bytes()
+    else: #no block or compressed (B/C) modes
+        raise FTPError.IP
+    return FTPAction(reply,functools.partial(setattr,state,"MODE",command))
+
+def parseSyst(state:ServerState,command:str)->bytes:
     if command == "":
-        return FTPReply.system()
+        return FTPReply.system.bytes()
     else:
         raise FTPError.IP
 
-def parseNoop(command:str)->str:
+def parseNoop(state:ServerState,command:str)->bytes:
     if command == "":
-        return FTPReply.command_ok()
+        return FTPReply.command_ok.bytes()
     else:
-        logging.error("No-parameter 'NOOP' command has parameter '" + command + "'")
+        logging.error("No-parameter 'NOOP' command has parameter '%s'",command)
+        raise FTPError.IP
+
+#STAT with no argument: the server's live metrics, as a multi-line 211 reply
+def parseStat(state:ServerState,command:str)->FTPAction:
+    if command != "":
         raise FTPError.IP
+    action = FTPAction(b"")
+    action.callback = functools.partial(perform_stat,action,state)
+    return action
 
-def parseQuit(command:str)->str:
+def perform_stat(action:FTPAction,state:ServerState):
+    if not isinstance(state,TCPServerState) or state.METRICS is None: #nothing measured in local mode
+        raise FTPError.invalid_command
+    lines = "".join(f" {line}\r\n" for line in state.METRICS.status_lines())
+    action.reply = FTPReply.status.bytes() + lines.encode('utf-8') + FTPReply.status_end.bytes()
+
+def parseQuit(state:ServerState,command:str)->bytes:
     if command == "":
-        SERVER_STATE.ACTIVE = False
-        return FTPReply.goodbye()
+        state.ACTIVE = False
+        return FTPReply.goodbye.bytes()
         # return FTPReply.command_ok()
     else:
         raise FTPError.IP
 
-def parsePort(command:str):
+def parsePort(state:ServerState,command:str):
     command = command.lstrip(" ")
     nums = command.split(",")
     if len(nums) != 6:
@@ -291,181 +398,1199 @@ def parsePort(command:str):
     port = str(portnum)
 
 
-    callback = functools.partial(record_port,address,portnum)
-    return FTPAction(FTPReply.port_success.reply(address=address,port=port),callback)
+    callback = functools.partial(record_port,state,address,portnum)
+    return FTPAction(FTPReply.port_success.bytes(address=address,port=port),callback)
 
-def record_port(address:str,port:int):
-    if isinstance(SERVER_STATE,TCPServerState):
-        SERVER_STATE.CLIENT_ADDR = address;
-        SERVER_STATE.CLIENT_PORT = port;
+def record_port(state:ServerState,address:str,port:int):
+    if isinstance(state,TCPServerState):
+        release_passive(state) #a PORT replaces any earlier PASV
+        state.CLIENT_ADDR = address;
+        state.CLIENT_PORT = port;
     pass
 
+def parsePasv(state:ServerState,command:str)->FTPAction:
+    if command != "":
+        raise FTPError.IP
+    return passive_action(state,extended=False)
+
+def parseEpsv(state:ServerState,command:str)->FTPAction:
+    command = command.lstrip(" ")
+    if command not in ("","1"): #only IPv4 data connections
+        raise FTPError.IP
+    return passive_action(state,extended=True)
+
+def passive_action(state:ServerState,extended:bool)->FTPAction:
+    if not isinstance(state,TCPServerState) or state.DATA_PORTS is None: #nothing to listen on in local mode
+        raise FTPError.invalid_command
+    #the reply names the leased port, so it's only filled in once the command is allowed to run
+    action = FTPAction(b"")
+    action.callback = functools.partial(open_passive,state,action,extended)
+    return action
+
+def open_passive(state:"TCPServerState",action:FTPAction,extended:bool):
+    assert state.DATA_PORTS is not None and state.PASV_ADDRESS is not None
+    release_passive(state)
+    state.CLIENT_ADDR = None
+    state.CLIENT_PORT = None
+    state.PASSIVE = state.DATA_PORTS.lease()
+    port = state.PASSIVE.getsockname()[1]
+    if extended:
+        action.reply = FTPReply.extended_passive.bytes(port=str(port))
+    else:
+        address = state.PASV_ADDRESS.replace(".",",") + f",{port//256},{port%256}"
+        action.reply = FTPReply.passive.bytes(address=address)
+
+def release_passive(state:"TCPServerState"):
+    if state.PASSIVE is not None:
+        assert state.DATA_PORTS is not None
+        state.DATA_PORTS.release(state.PASSIVE)
+        state.PASSIVE = None
 
-def parseRetr(command:str)->FTPAction:
+
+def parse_path(command:str)->str:
     command = command.lstrip(" ")
     command = command.replace("\\","/")
     if len(command) > 0 and command[0] == "/":
         command = command[1:]
-    filepath = re.fullmatch("[ -~]+",command)
-    if filepath is None:
+    if not is_printable(command):
         raise FTPError.invalid_parameter    
-    callback = functools.partial(perform_retr,filepath.string)
-    return FTPAction(FTPReply.file_ok() + FTPReply.file_completed(),callback); #this is just dumb but whatever
+    return command
 
-def perform_retr(command):
-    if os.path.exists(command):
-        if isinstance(SERVER_STATE,TCPServerState):
-            try:
-                #TODO: socket error handling
-                datasock = socket.socket(socket.AF_INET,socket.SOCK_STREAM);
-                datasock.connect((SERVER_STATE.CLIENT_ADDR,SERVER_STATE.CLIENT_PORT))
-                logging.info(datasock)
-                with open(command,"rb") as f:
-                    datasock.sendfile(f);
-                datasock.close()
-                return
-            except OSError as e:
-                import traceback as tb
-                logging.error("\n".join(tb.format_exception(e)))
-                raise FTPError.file_ok_bad_transfer
+def parseRetr(state:ServerState,command:str)->FTPAction:
+    command = parse_path(command)
+    callback = functools.partial(perform_retr,state,command)
+    return FTPAction(RETR_OK,callback); #this is just dumb but whatever
+
+def parseRest(state:ServerState,command:str)->FTPAction:
+    command = command.lstrip(" ")
+    if not (command.isascii() and command.isdigit()):
+        raise FTPError.invalid_parameter
+    offset = int(command)
+    callback = functools.partial(restart_at,state,offset,None)
+    return FTPAction(FTPReply.restart.bytes(offset=str(offset)),callback)
+
+#RANG <start> <end>, both inclusive: the next RETR sends only those bytes
+def parseRang(state:ServerState,command:str)->FTPAction:
+    bounds = command.lstrip(" ").split(" ")
+    if len(bounds) != 2 or not all(b.isascii() and b.isdigit() for b in bounds):
+        raise FTPError.invalid_parameter
+    start,end = map(int,bounds)
+    if end < start:
+        raise FTPError.invalid_parameter
+    callback = functools.partial(restart_at,state,start,end+1)
+    return FTPAction(FTPReply.byte_range.bytes(offset=str(start),end=str(end)),callback)
+
+def restart_at(state:ServerState,offset:int,end:int|None):
+    state.REST_OFFSET = offset
+    state.REST_END = end
+
+def parseSize(state:ServerState,command:str)->FTPAction:
+    command = parse_path(command)
+    #the size is only looked up once the session is allowed to ask
+    action = FTPAction(b"")
+    action.callback = functools.partial(perform_size,action,command)
+    return action
+
+def perform_size(action:FTPAction,command:str):
+    try:
+        size = os.stat(command).st_size
+    except OSError:
+        raise FTPError.file_error
+    action.reply = FTPReply.file_size.bytes(size=str(size))
+
+def perform_retr(state:ServerState,command):
+    #a REST or RANG only applies to the RETR right after it
+    offset,end = state.REST_OFFSET,state.REST_END
+    state.REST_OFFSET,state.REST_END = 0,None
+    count = None if end is None else end - offset
+    level = state.DEFLATE_LEVEL if isinstance(state,TCPServerState) and state.MODE == "Z" else None
+    source:"str|CachedFile" = command
+    if isinstance(state,TCPServerState) and state.FILES is not None:
+        try:
+            source = state.FILES.acquire(command) #no path lookup or open for a file sent recently
+        except OSError:
+            pass #missing, or something open() refuses: handled exactly as without the cache
+    if source is not command or os.path.exists(command):
+        if isinstance(state,TCPServerState):
+            start_transfer(state,source,offset,count,level)
+            return
 
         else:
-            SERVER_STATE.NUM_RETRD += 1
+            state.NUM_RETRD += 1
             try:
-                shutil.copy(command,RETR_OUT/f"file{SERVER_STATE.NUM_RETRD}");
+                if offset or count is not None:
+                    with open(command,"rb") as src,open(RETR_OUT/f"file{state.NUM_RETRD}","wb") as dst:
+                        src.seek(offset)
+                        if count is None:
+                            shutil.copyfileobj(src,dst)
+                        else:
+                            dst.write(src.read(count))
+                else:
+                    shutil.copy(command,RETR_OUT/f"file{state.NUM_RETRD}");
                 return 
             except OSError as e:
                 import traceback as tb
                 logging.error(tb.format_exception(e))
                 pass
     raise FTPError.file_error
+
+#NLST [pattern]: the names of the regular files matching a glob (default *), one per line over the data connection
+def parseNlst(state:ServerState,command:str)->FTPAction:
+    command = parse_path(command) or "*"
+    callback = functools.partial(perform_nlst,state,command)
+    return FTPAction(RETR_OK,callback)
+
+def perform_nlst(state:ServerState,pattern:str):
+    if not isinstance(state,TCPServerState): #no data connection to list over in local mode
+        raise FTPError.invalid_command
+    names = sorted(name for name in glob.glob(pattern) if os.path.isfile(name))
+    listing = "".join(name + "\r\n" for name in names).encode('utf-8')
+    level = state.DEFLATE_LEVEL if state.MODE == "Z" else None
+    start_transfer(state,listing,0,None,level)
+
+def start_transfer(state:"TCPServerState",source:"str|CachedFile|bytes",offset:int,count:int|None,level:int|None):
+    if state.PASSIVE is not None: #the client connects to the port we leased it
+        assert state.DATA_PORTS is not None and state.PEER is not None
+        listener,state.PASSIVE = state.PASSIVE,None
+        open_data = functools.partial(state.DATA_PORTS.accept,listener,state.PEER[0])
+    else:
+        assert state.CLIENT_ADDR is not None and state.CLIENT_PORT is not None
+        open_data = functools.partial(socket.create_connection,(state.CLIENT_ADDR,state.CLIENT_PORT))
+    if state.TRANSFERS is not None:
+        #the session's control loop carries on: the final reply is sent once the transfer finishes,
+        #and every reply after it waits its turn behind it, see FTPServer.handle_lines
+        slot = PendingReply()
+        state.REPLIES.append(slot)
+        state.TRANSFERS.submit(state,slot,send_file,open_data,source,offset,count,level,state.BUCKETS)
+    else:
+        for wait in send_file(open_data,source,offset,count,level,state.BUCKETS):
+            time.sleep(wait)
+
+def send_file(open_data:Callable[[],socket.socket],source:"str|CachedFile|bytes",offset:int=0,count:int|None=None,
+              level:int|None=None,buckets:"tuple[TokenBucket,...]"=())->Generator[float,None,int]:
+    #level: deflate at this zlib level (MODE Z), None sends the bytes as they are
+    #buckets: bandwidth caps the data has to fit under, see TokenBucket
+    #a generator: a capped transfer yields every wait its caps call for (see send_shaped), so whoever
+    #runs it can put it aside meanwhile; it returns the bytes that went over the data connection
+    try:
+        with open_data() as datasock:
+            logging.info("%s",datasock)
+            if isinstance(source,CachedFile):
+                #hot tier straight from memory, else the shared file (always given an offset, so sharing is fine).
+                #data is read once: demote() can clear it on the loop thread at any moment, this reference stays good
+                data = source.data
+                src = data if data is not None else source.file
+                return (yield from send_capped(datasock,src,offset,count,level,buckets))
+            elif isinstance(source,bytes):
+                return (yield from send_capped(datasock,source,offset,count,level,buckets))
+            else:
+                with open(source,"rb") as f:
+                    return (yield from send_capped(datasock,f,offset,count,level,buckets))
+    except OSError as e:
+        import traceback as tb
+        logging.error("\n".join(tb.format_exception(e)))
+        raise FTPError.file_ok_bad_transfer
+    finally:
+        if isinstance(source,CachedFile):
+            source.release()
     
 
-parsers:dict[str,Callable[[str],str|FTPAction]] = {
-    "USER":parseUser,
-    "PASS":parsePass,
-    "TYPE":parseType,
-    "SYST":parseSyst,
-    "NOOP":parseNoop,
-    "QUIT":parseQuit,
-    "PORT":parsePort,
-    "RETR":parseRetr,}
+def send_capped(datasock:socket.socket,src:"bytes|BinaryIO",offset:int,count:int|None,level:int|None,
+                buckets:"tuple[TokenBucket,...]")->Generator[float,None,int]:
+    if buckets:
+        return (yield from send_shaped(datasock,src,offset,count,level,buckets))
+    return send_from(datasock,src,offset,count,level) #uncapped sessions never pay for the shaping
+
+def send_from(datasock:socket.socket,src:"bytes|BinaryIO",offset:int,count:int|None,level:int|None)->int:
+    if level is not None:
+        return send_deflated(datasock,src,offset,count,level)
+    elif isinstance(src,bytes):
+        end = len(src) if count is None else min(len(src),offset + count)
+        datasock.sendall(memoryview(src)[offset:end])
+        return max(0,end - offset)
+    else:
+        return datasock.sendfile(src,offset,count);
+
+DEFLATE_CHUNK = 256*1024
+
+def send_deflated(datasock:socket.socket,src:"bytes|BinaryIO",offset:int,count:int|None,level:int)->int:
+    sent = 0
+    for out in deflate_chunks(src,offset,count,level):
+        datasock.sendall(out)
+        sent += len(out)
+    return sent
+
+def deflate_chunks(src:"bytes|BinaryIO",offset:int,count:int|None,level:int)->Iterator[bytes]:
+    #one zlib stream, fed a chunk at a time so memory stays bounded whatever the file size
+    compressor = zlib.compressobj(level)
+    view = memoryview(src) if isinstance(src,bytes) else None
+    pos = offset
+    while count is None or pos < offset + count:
+        want = DEFLATE_CHUNK if count is None else min(DEFLATE_CHUNK,offset + count - pos)
+        chunk = view[pos:pos + want] if view is not None else os.pread(src.fileno(),want,pos)
+        if len(chunk) == 0:
+            break
+        pos += len(chunk)
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+#a bandwidth cap: tokens are bytes, refilled at rate per second up to burst. shared by every
+#transfer under the cap; a take() bigger than what's there goes into debt and returns how long
+#until it's paid off, so concurrent senders queue up behind each other at the capped rate
+class TokenBucket:
+    def __init__(self,rate:float,burst:float|None=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate/10,SHAPED_CHUNK) #about 100 ms worth
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self,amount:int)->float:
+        #seconds to wait before sending amount
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst,self.tokens + (now - self.stamp)*self.rate)
+            self.stamp = now
+            self.tokens -= amount
+            return max(0.0,-self.tokens/self.rate)
+
+SHAPED_CHUNK = 64*1024
+
+#send_from for a capped session, cut into SHAPED_CHUNK pieces that each take their tokens first.
+#rather than sleeping off the buckets' debt on a transfer worker, it yields the wait, and the
+#transfer pool puts the transfer aside until then with the worker free for other sessions
+def send_shaped(datasock:socket.socket,src:"bytes|BinaryIO",offset:int,count:int|None,level:int|None,
+                buckets:"tuple[TokenBucket,...]")->Generator[float,None,int]:
+    if level is not None or isinstance(src,bytes):
+        if level is not None:
+            pieces:Iterable[bytes|memoryview] = deflate_chunks(src,offset,count,level)
+        else:
+            end = len(src) if count is None else min(len(src),offset + count)
+            pieces = [memoryview(src)[offset:end]]
+        sent = 0
+        for piece in pieces:
+            view = memoryview(piece)
+            for pos in range(0,len(view),SHAPED_CHUNK):
+                chunk = view[pos:pos + SHAPED_CHUNK]
+                wait = max(bucket.take(len(chunk)) for bucket in buckets)
+                if wait > 0:
+                    yield wait
+                datasock.sendall(chunk)
+                sent += len(chunk)
+        return sent
+    end = os.fstat(src.fileno()).st_size #so the last chunk only takes the tokens it needs
+    if count is not None:
+        end = min(end,offset + count)
+    pos = offset
+    while pos < end:
+        want = min(SHAPED_CHUNK,end - pos)
+        wait = max(bucket.take(want) for bucket in buckets)
+        if wait > 0:
+            yield wait
+        sent = datasock.sendfile(src,pos,want)
+        if sent == 0: #shrank since the fstat
+            break
+        pos += sent
+    return max(0,pos - offset)
+
+#what a command needs the session to have done before it may run
+class Requires(Enum):
+    nothing = 0
+    username = 1 #USER accepted
+    login = 2 #USER+PASS accepted
+    port = 3 #logged in, with a PORT/PASV waiting for its RETR
+
+@dataclass(frozen=True)
+class Command:
+    parse:Callable[[ServerState,str],bytes|FTPAction]
+    requires:Requires
+    sets:tuple[tuple[str,bool],...] = () #state flags recorded once the command has executed
+
+#the whole USER -> PASS -> PORT -> RETR state machine lives in this table
+commands:dict[str,Command] = {
+    "USER":Command(parseUser,Requires.nothing,(("USERNAME",True),("PASSWORD",False))),
+    "PASS":Command(parsePass,Requires.username,(("PASSWORD",True),)),
+    "TYPE":Command(parseType,Requires.login),
+    "MODE":Command(parseMode,Requires.login),
+    "SYST":Command(parseSyst,Requires.login),
+    "NOOP":Command(parseNoop,Requires.login),
+    "QUIT":Command(parseQuit,Requires.login),
+    "PORT":Command(parsePort,Requires.login,(("PORT_OPEN",True),)),
+    "PASV":Command(parsePasv,Requires.login,(("PORT_OPEN",True),)),
+    "EPSV":Command(parseEpsv,Requires.login,(("PORT_OPEN",True),)),
+    "RETR":Command(parseRetr,Requires.port,(("PORT_OPEN",False),)),
+    "NLST":Command(parseNlst,Requires.port,(("PORT_OPEN",False),)),
+    "REST":Command(parseRest,Requires.login),
+    "RANG":Command(parseRang,Requires.login),
+    "SIZE":Command(parseSize,Requires.login),
+    "STAT":Command(parseStat,Requires.login),
+}
 
 
 ##### Server Networking stuff #####
+
+#incremental line splitter for a control connection's byte stream.
+#only the bytes that arrived since the last scan are searched for a newline,
+#so a command trickling in over many packets is never rescanned from the start
+class LineFramer:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.scanned = 0 #no newline in buffer[:scanned]
+
+    def feed(self,data:bytes):
+        self.buffer += data
+
+    def next_line(self)->bytes|None:
+        #returns the next line without its "\n" (the "\r" is left for parseCommand to check)
+        idx = self.buffer.find(b"\n",self.scanned)
+        if idx == -1:
+            self.scanned = len(self.buffer)
+            return None
+        line = bytes(self.buffer[:idx])
+        del self.buffer[:idx+1]
+        self.scanned = 0
+        return line
+
+    def __len__(self):
+        return len(self.buffer)
+
 @dataclass(kw_only=True)
 class TCPServerState(ServerState):
-    SERVER_PORT:int
-    SERVERSOCK:socket.socket|None = None
+    #one of these per control connection
     CONN:socket.socket|None = None
+    PEER:tuple[str,int]|None = None
     CLIENT_ADDR:str|None = None
     CLIENT_PORT:int|None = None
-
-    def __post_init__(self):
-        self.reset_state()
+    BUFFER:LineFramer = field(default_factory=LineFramer)
+    TRANSFERS:"TransferPool|None" = None
+    PENDING:int = 0 #transfers submitted whose reply hasn't been sent yet
+    DATA_PORTS:"DataPortPool|None" = None
+    PASV_ADDRESS:str|None = None #address handed out in 227 replies
+    PASSIVE:socket.socket|None = None #data listener leased by the last PASV/EPSV
+    FILES:"FileCache|None" = None #open files shared by every session
+    DEFLATE_LEVEL:int = 6 #zlib level for MODE Z
+    BUCKETS:"tuple[TokenBucket,...]" = () #bandwidth caps on this session's transfers
+    LAST_ACTIVE:float = 0.0 #time.monotonic() of the last command or finished transfer
+    METRICS:"Metrics|None" = None #the server's, for STAT
+    OUTBOX:bytearray = field(default_factory=bytearray) #replies the socket hasn't taken yet
+    REPLIES:"deque[PendingReply|bytes]" = field(default_factory=deque) #replies held for transfers still running, in order
+    HELD:int = 0 #bytes of the replies held in REPLIES
+    EVENTS:int = 0 #what the selector is watching this connection for
+
+    def __str__(self):
+        return f"{self.PEER} {super().__str__()} pending={self.PENDING}"
 
     def reset_state(self):
         super().reset_state()
         self.CLIENT_ADDR = None
         self.CLIENT_PORT = None
+        self.BUFFER = LineFramer()
+        self.OUTBOX = bytearray()
+        self.REPLIES.clear()
+        self.HELD = 0
+        release_passive(self)
 
-        
         #close existing connection if it exists
         if self.CONN is not None:
             self.CONN.close()
 
-        #open new TCP socket if needed
-        if self.SERVERSOCK is None:
-            self.SERVERSOCK = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
-            self.SERVERSOCK.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) 
-            self.SERVERSOCK.bind(("", self.SERVER_PORT)) 
-            self.SERVERSOCK.listen(1)  # Allow only one connection at a time 
-
 
 class PortClosed(Exception):
     pass
 
-def start_FTP_server():
-    assert isinstance(SERVER_STATE,TCPServerState)
-    logging.info("Opening FTP server")
-    sock = SERVER_STATE.SERVERSOCK
-    assert sock is not None
-    while True:
-        logging.info("awaiting connection")
-        res = None
-        while True: #for keyboardinterrupt reasons
-            sock.settimeout(2)
-            try:
-                res = sock.accept()
-                break
-            except TimeoutError:
-                continue
-        conn,(hostaddr,hostport) = res
-        # print("server connected")
-        logging.info("client connected from address " + str((hostaddr,hostport)))
-
-        SERVER_STATE.CONN = conn
-        SERVER_STATE.ACTIVE = True
+#a transfer's place among its session's held replies, filled in when the transfer finishes
+class PendingReply:
+    __slots__ = ("reply",)
+
+    def __init__(self):
+        self.reply:bytes|None = None
+
+DATA_TIMEOUT = 5 #seconds to wait for a passive-mode client to connect
+
+#listening data sockets bound once at startup and leased to sessions for PASV/EPSV,
+#so a passive transfer costs the client one connect and the server no bind at all
+class DataPortPool:
+    def __init__(self,size:int,host:str=""):
+        self.host = host
+        self.lock = threading.Lock()
+        self.free = [self.bind() for _ in range(size)]
+        self.pooled = set(self.free)
+        self.leased = 0
+
+    def bind(self)->socket.socket:
+        sock = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+        sock.bind((self.host,0))
+        sock.listen(8)
+        return sock
+
+    def lease(self)->socket.socket:
+        with self.lock:
+            self.leased += 1
+            if self.free:
+                return self.free.pop()
+        return self.bind() #pool exhausted, fall back to a one-off port
+
+    def release(self,listener:socket.socket):
+        #throw away connections nobody accepted, so the next session doesn't get them
+        listener.setblocking(False)
+        try:
+            while True:
+                listener.accept()[0].close()
+        except OSError:
+            pass
+        with self.lock:
+            self.leased -= 1
+            if listener in self.pooled:
+                self.free.append(listener)
+                return
+        listener.close()
 
-        conn.send(FTPReply.server_ok.bytes())
-        sys.stdout.buffer.write(FTPReply.server_ok.bytes());
-        sys.stdout.flush()
+    def accept(self,listener:socket.socket,peer:str)->socket.socket:
+        #data connection from the control connection's host; the listener goes back to the pool either way
+        try:
+            deadline = time.monotonic() + DATA_TIMEOUT
+            while True:
+                listener.settimeout(max(0.0,deadline - time.monotonic()))
+                datasock,(address,_) = listener.accept()
+                if address == peer:
+                    datasock.settimeout(None)
+                    return datasock
+                logging.warning("Rejected data connection from %s, expected %s",address,peer)
+                datasock.close()
+        finally:
+            self.release(listener)
+
+    def close(self):
+        with self.lock:
+            for sock in self.pooled:
+                sock.close()
+            self.free.clear()
+
+#runs RETR data transfers off the control loop; a finished transfer's reply is handed to on_done.
+#a transfer is a generator (see send_file): whenever a capped one yields a wait, it's taken off its
+#worker and handed to the pacer thread, which queues it again once the wait is over, so capped
+#sessions waiting for tokens never keep the workers from anybody else's transfers
+class TransferPool:
+    def __init__(self,workers:int,on_done:Callable[[TCPServerState,PendingReply,bytes],None],metrics:Metrics|None=None):
+        self.workers = workers
+        self.on_done = on_done
+        self.metrics = metrics
+        self.executor = ThreadPoolExecutor(max_workers=workers,thread_name_prefix="transfer")
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.paced = 0 #put aside by their caps
+        self.peak_queued = 0
+        self.peak_active = 0
+        self.completed = 0
+        self.failed = 0
+        self.timers:list[tuple[float,int,tuple]] = [] #heap of (when,tiebreak,run's arguments) for paced transfers
+        self.timer_count = 0
+        self.timer_wakeup = threading.Condition(self.lock)
+        self.closing = False
+        self.pacer = threading.Thread(target=self.run_timers,name="transfer-pacer",daemon=True)
+        self.pacer.start()
+
+    def submit(self,state:TCPServerState,slot:PendingReply,transfer:Callable[...,Generator[float,None,int]],*args):
+        state.PENDING += 1
+        self.queue(state,slot,transfer(*args),None)
+
+    def queue(self,*run_args):
+        with self.lock:
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued,self.queued)
+        self.executor.submit(self.run,*run_args)
+
+    def run(self,state:TCPServerState,slot:PendingReply,steps:Generator[float,None,int],start:float|None):
+        with self.lock:
+            self.queued -= 1
+            self.active += 1
+            self.peak_active = max(self.peak_active,self.active)
+        ok = False
+        if start is None:
+            start = time.perf_counter()
+        sent = 0
+        error:FTPError = FTPError.bad_transfer
+        try:
+            wait = next(steps)
+        except StopIteration as done:
+            sent = done.value
+            reply = TRANSFER_DONE
+            ok = True
+        except FTPError as f:
+            f.__traceback__ = None #see parseCommand
+            if f is not FTPError.file_ok_bad_transfer: #its 150 is already out
+                error = f
+            reply = error.data
+        except Exception as e:
+            import traceback as tb
+            logging.error("\n".join(tb.format_exception(e)))
+            reply = error.data
+        else: #over its cap: off the worker until it may send again
+            with self.lock:
+                self.active -= 1
+                self.paced += 1
+                if self.closing: #nobody to send its reply to any more
+                    self.paced -= 1
+                    steps.close()
+                    return
+                self.timer_count += 1
+                heapq.heappush(self.timers,(time.monotonic() + wait,self.timer_count,(state,slot,steps,start)))
+                self.timer_wakeup.notify()
+            return
+        if self.metrics is not None:
+            self.metrics.transfer(time.perf_counter() - start,sent,None if ok else error.val)
+        with self.lock:
+            self.active -= 1
+            self.completed += 1
+            self.failed += not ok
+        logging.info("Transfer finished for %s; %s",state.PEER,self)
+        self.on_done(state,slot,reply)
+
+    def run_timers(self):
+        #the pacer thread: queues each paced transfer again once its wait is over
+        with self.lock:
+            while not self.closing:
+                if not self.timers:
+                    self.timer_wakeup.wait()
+                    continue
+                due = self.timers[0][0] - time.monotonic()
+                if due > 0:
+                    self.timer_wakeup.wait(due)
+                    continue
+                run_args = heapq.heappop(self.timers)[2]
+                self.paced -= 1
+                self.queued += 1
+                self.peak_queued = max(self.peak_queued,self.queued)
+                self.executor.submit(self.run,*run_args)
+
+    def __str__(self):
+        return self.stats()
+
+    def stats(self)->str:
+        return (f"transfers active={self.active}/{self.workers} queued={self.queued} paced={self.paced} "
+                f"peak_active={self.peak_active} peak_queued={self.peak_queued} "
+                f"completed={self.completed} failed={self.failed}")
+
+    def shutdown(self):
+        #transfers on a worker finish; paced ones are dropped, their sessions are gone by now
+        with self.lock:
+            self.closing = True
+            self.timer_wakeup.notify()
+            paced = [heapq.heappop(self.timers)[2][2] for _ in range(len(self.timers))]
+            self.paced -= len(paced)
+        self.pacer.join()
+        for steps in paced:
+            steps.close()
+        self.executor.shutdown(wait=True)
+
+#an open file handed out by FileCache; whoever acquired it calls release() when the send is done
+@dataclass(eq=False)
+class CachedFile:
+    cache:"FileCache"
+    path:str
+    file:"io.FileIO"
+    stat:os.stat_result
+    checked:float #monotonic time the path was last stat'ed
+    users:int = 0
+    evicted:bool = False
+    requests:int = 1 #halved now and then, so yesterday's favourites don't stay hot forever
+    last_used:float = 0.0
+    data:bytes|None = None #the whole file, while it's in the hot tier
+
+    def release(self):
+        self.cache.release(self)
+
+    def same_file(self,stat:os.stat_result)->bool:
+        return (self.stat.st_dev,self.stat.st_ino,self.stat.st_mtime_ns,self.stat.st_size) == \
+               (stat.st_dev,stat.st_ino,stat.st_mtime_ns,stat.st_size)
+
+#LRU of RETR paths -> open file, so a popular file isn't looked up and opened for every request.
+#an entry is trusted for `valid` seconds, then re-stat'ed and reopened if the path now names
+#a different or modified file. at most max_open files are held open; an evicted file stays open
+#until the transfers still using it are done.
+#with hot_bytes > 0, files of up to hot_max_file bytes that keep being asked for are also read
+#into memory (the hot tier) and sent from there. when the budget is full the least requested
+#hot file makes room, the least recently used one among equals, but only for a busier file
+HOT_AFTER = 2 #requests before a file is worth keeping in memory
+HOT_DECAY = 1024 #requests between halvings of every request count
+
+class FileCache:
+    def __init__(self,max_open:int=256,valid:float=1.0,hot_bytes:int=0,hot_max_file:int=64*1024):
+        self.max_open = max_open
+        self.valid = valid
+        self.hot_bytes = hot_bytes
+        self.hot_max_file = hot_max_file
+        self.lock = threading.Lock()
+        self.entries:OrderedDict[str,CachedFile] = OrderedDict()
+        self.hot:set[CachedFile] = set()
+        self.hot_used = 0
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0 #misses because the file changed
+        self.evictions = 0
+        self.hot_hits = 0
+        self.promotions = 0
+        self.demotions = 0
+
+    def acquire(self,path:str)->CachedFile:
+        #raises OSError if the path can't be opened
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and now - entry.checked < self.valid:
+                return self.hit(entry,now)
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                if entry.same_file(stat):
+                    entry.checked = now
+                    return self.hit(entry,now)
+                self.stale += 1
+                self.drop(entry)
+            self.misses += 1
+        f = open(path,"rb",buffering=0)
+        entry = CachedFile(self,path,f,os.fstat(f.fileno()),now,users=1,last_used=now)
+        with self.lock:
+            self.count_request()
+            old = self.entries.get(path)
+            if old is not None: #someone else opened it meanwhile
+                self.drop(old)
+            self.entries[path] = entry
+            while len(self.entries) > self.max_open:
+                self.evictions += 1
+                self.drop(next(iter(self.entries.values())))
+        if log.isEnabledFor(logging.INFO):
+            logging.info("File cache miss for %s; %s",path,self)
+        return entry
+
+    def hit(self,entry:CachedFile,now:float)->CachedFile:
+        #lock held
+        self.entries.move_to_end(entry.path)
+        entry.users += 1
+        entry.requests += 1
+        entry.last_used = now
+        self.hits += 1
+        self.count_request()
+        if entry.data is not None:
+            self.hot_hits += 1
+        elif self.hot_bytes > 0 and entry.requests >= HOT_AFTER and entry.stat.st_size <= self.hot_max_file:
+            self.promote(entry)
+        return entry
+
+    def count_request(self):
+        #lock held
+        self.requests += 1
+        if self.requests % HOT_DECAY == 0:
+            for entry in self.entries.values():
+                entry.requests //= 2
+
+    def promote(self,entry:CachedFile):
+        #lock held; small files only, so the read is quick.
+        #pinned bytes rather than mmap: a mapped file truncated underneath us would kill the server with SIGBUS
+        size = entry.stat.st_size
+        if size > self.hot_bytes:
+            return
+        while self.hot_used + size > self.hot_bytes:
+            victim = min(self.hot,key=lambda e: (e.requests,e.last_used))
+            if victim.requests >= entry.requests:
+                return
+            self.demote(victim)
+        data = os.pread(entry.file.fileno(),size,0)
+        if len(data) != size: #changed since it was stat'ed, leave it on disk
+            return
+        entry.data = data
+        self.hot.add(entry)
+        self.hot_used += size
+        self.promotions += 1
+
+    def demote(self,entry:CachedFile):
+        #lock held; a transfer already sending the data keeps its own reference
+        if entry in self.hot:
+            self.hot.remove(entry)
+            self.hot_used -= entry.stat.st_size
+            entry.data = None
+            self.demotions += 1
+
+    def drop(self,entry:CachedFile):
+        #lock held
+        if self.entries.get(entry.path) is entry:
+            del self.entries[entry.path]
+        self.demote(entry)
+        entry.evicted = True
+        if entry.users == 0:
+            entry.file.close()
+
+    def release(self,entry:CachedFile):
+        with self.lock:
+            entry.users -= 1
+            if entry.evicted and entry.users == 0:
+                entry.file.close()
+
+    def __str__(self):
+        return self.stats()
+
+    def stats(self)->str:
+        stats = (f"files open={len(self.entries)}/{self.max_open} hits={self.hits} misses={self.misses} "
+                 f"stale={self.stale} evictions={self.evictions}")
+        if self.hot_bytes > 0:
+            stats += (f" hot={len(self.hot)} files/{self.hot_used}/{self.hot_bytes} bytes hot_hits={self.hot_hits} "
+                      f"promotions={self.promotions} demotions={self.demotions}")
+        return stats
+
+    def close(self):
+        with self.lock:
+            for entry in list(self.entries.values()):
+                self.drop(entry)
+
+#replies buffered for a session before the server stops reading its commands
+OUTBOX_HIGH_WATER = 256*1024
+#most reply bytes a pipelined batch collects before they're sent
+SEND_BATCH = 64*1024
+
+#owns the listening socket and every open session, all multiplexed over one selector
+class FTPServer:
+    def __init__(self,port:int,backlog:int=128,transfer_workers:int=8,transcript:StdoutTranscript|None=None,
+                 data_ports:int=16,pasv_address:str|None=None,open_files:int=256,open_files_valid:float=1.0,
+                 hot_bytes:int=0,hot_max_file:int=64*1024,deflate_level:int=6,reuse_port:bool=False,
+                 max_sessions:int=0,idle_timeout:float=0,session_rate:float=0,total_rate:float=0,
+                 metrics:bool=True,metrics_port:int|None=None):
+        self.SERVERSOCK = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+        self.SERVERSOCK.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) 
+        if reuse_port: #one of several processes listening on this port, see Supervisor
+            self.SERVERSOCK.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.SERVERSOCK.bind(("", port)) 
+        self.SERVERSOCK.listen(backlog)
+        self.SERVERSOCK.setblocking(False)
+        self.SERVER_PORT:int = self.SERVERSOCK.getsockname()[1]
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.SERVERSOCK,selectors.EVENT_READ,self.accept_session)
+        self.sessions:dict[socket.socket,TCPServerState] = {}
+        self.transcript = transcript if transcript is not None else StdoutTranscript()
+
+        #transfer workers hand finished replies back through this queue and poke the selector awake
+        self.finished:queue.SimpleQueue[tuple[TCPServerState,PendingReply,bytes]] = queue.SimpleQueue()
+        self.wakeup_recv,self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.selector.register(self.wakeup_recv,selectors.EVENT_READ,self.deliver_transfers)
+        #STAT and, given metrics_port, GET http://127.0.0.1:<metrics_port>/metrics read these
+        self.metrics = Metrics(set(commands),self.counters) if metrics else None
+        self.metrics_endpoint = MetricsEndpoint(self.metrics,metrics_port) if self.metrics is not None and metrics_port is not None else None
+        self.transfers = TransferPool(transfer_workers,self.transfer_done,self.metrics)
+        self.data_ports = DataPortPool(data_ports)
+        self.pasv_address = pasv_address
+        self.files = FileCache(open_files,open_files_valid,hot_bytes,hot_max_file) if open_files > 0 else None
+        self.deflate_level = deflate_level
+        self.sessions_opened = 0
+        self.commands = 0
+
+        #limits, 0 meaning none: sessions beyond max_sessions get a 421 and are hung up on,
+        #sessions quiet for idle_timeout seconds are closed, RETR data goes out at no more than
+        #session_rate bytes/s per session and total_rate bytes/s for all of them together
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.session_rate = session_rate
+        self.total_bucket = TokenBucket(total_rate) if total_rate > 0 else None
+        self.next_idle_check = 0.0
+        self.sessions_rejected = 0
+        self.sessions_idled = 0
+
+    def accept_session(self,sock:socket.socket,mask:int):
+        try:
+            conn,(hostaddr,hostport) = sock.accept()
+        except BlockingIOError: #another wakeup got there first
+            return
+        logging.info("client connected from address %s",(hostaddr,hostport))
+        if self.max_sessions and len(self.sessions) >= self.max_sessions: #full: say so and hang up, don't queue
+            logging.warning("refusing %s, %d sessions open",(hostaddr,hostport),len(self.sessions))
+            self.sessions_rejected += 1
+            with conn:
+                try:
+                    conn.setblocking(False) #a fresh socket takes 40 bytes; if not, the client misses out
+                    conn.send(self.echo_reply(FTPReply.busy.bytes()))
+                except OSError:
+                    pass
+            return
+        self.sessions_opened += 1
+        #never blocks the loop: replies the client isn't reading wait in the session's OUTBOX, see send
+        conn.setblocking(False)
+        #replies are already one send per batch; don't let Nagle hold a transfer's reply behind the batch's ack
+        conn.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+
+        buckets = (TokenBucket(self.session_rate),) if self.session_rate > 0 else ()
+        if self.total_bucket is not None:
+            buckets += (self.total_bucket,)
+        state = TCPServerState(CONN=conn,PEER=(hostaddr,hostport),TRANSFERS=self.transfers,DATA_PORTS=self.data_ports,
+                               PASV_ADDRESS=self.pasv_address or conn.getsockname()[0],FILES=self.files,
+                               DEFLATE_LEVEL=self.deflate_level,BUCKETS=buckets,LAST_ACTIVE=time.monotonic(),
+                               METRICS=self.metrics)
+        self.sessions[conn] = state
+        state.EVENTS = selectors.EVENT_READ
+        self.selector.register(conn,state.EVENTS,self.session_ready)
+
+        self.transcript.write(FTPReply.server_ok.bytes());
+        self.send(state,FTPReply.server_ok.bytes())
+
+    def session_ready(self,conn:socket.socket,mask:int):
+        state = self.sessions[conn]
+        if mask & selectors.EVENT_WRITE:
+            self.flush(state)
+            if state.CONN is None: #the flush found the connection gone
+                return
+            self.handle_lines(state) #any lines left waiting while the outbox was full
+        if mask & selectors.EVENT_READ and state.CONN is not None:
+            self.read_session(state)
 
-        commands = ""
+    def read_session(self,state:TCPServerState):
+        try:
+            data = state.CONN.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.close_session(state)
+            return
+        if len(data) == 0: #port closed! drop the session
+            logging.info("Port closed by %s! Closing session...",state.PEER)
+            self.close_session(state)
+            return
+        state.BUFFER.feed(data)
+        state.LAST_ACTIVE = time.monotonic()
+        self.handle_lines(state)
+
+    def handle_lines(self,state:TCPServerState):
+        #pipelining: handle every complete line in the buffer, in order, and answer them in sends of
+        #up to SEND_BATCH bytes. a client that doesn't read its replies fills its outbox up to
+        #OUTBOX_HIGH_WATER; then its lines wait, and its socket isn't read, until the outbox drains.
+        #the mark is checked against the outbox as each send leaves it, so lines are only ever left
+        #in the buffer while the outbox is non-empty, i.e. while a writable socket will bring us back.
+        #replies go out strictly in command order: while a background transfer owes its final reply,
+        #every later reply is held behind it in REPLIES, counting towards the mark, and
+        #deliver_transfers releases them
+        replies:list[bytes] = []
+        batched = 0
+        while state.ACTIVE and len(state.OUTBOX) + state.HELD + batched < OUTBOX_HIGH_WATER:
+            line = state.BUFFER.next_line()
+            if line is None:
+                break
+            held = len(state.REPLIES)
+            reply = self.handle_line(state,line.decode('utf-8',errors='replace'))
+            if held: #ahead of the place a deferred RETR has just taken for its final reply
+                state.REPLIES.insert(held,reply)
+                state.HELD += len(reply)
+                continue
+            replies.append(self.echo_reply(reply))
+            batched += len(reply)
+            if batched >= SEND_BATCH:
+                self.send(state,b"".join(replies))
+                if state.CONN is None:
+                    return
+                replies = []
+                batched = 0
+        if replies:
+            self.send(state,b"".join(replies))
+        if state.CONN is not None:
+            self.watch(state)
+            self.close_if_done(state)
+
+    def send(self,state:TCPServerState,data:bytes):
+        #whatever the socket won't take now goes out from session_ready once it's writable
+        if not state.OUTBOX:
+            try:
+                sent = state.CONN.send(data)
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                self.close_session(state)
+                return
+            data = data[sent:]
+        state.OUTBOX += data
+        self.watch(state)
 
+    def flush(self,state:TCPServerState):
+        try:
+            sent = state.CONN.send(state.OUTBOX)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.close_session(state)
+            return
+        del state.OUTBOX[:sent]
+        self.watch(state)
+        self.close_if_done(state)
+
+    def watch(self,state:TCPServerState):
+        #read unless the outbox and held replies are over the high-water mark, write while there's anything in it
+        events = selectors.EVENT_READ if len(state.OUTBOX) + state.HELD < OUTBOX_HIGH_WATER else 0
+        if state.OUTBOX:
+            events |= selectors.EVENT_WRITE
+        if events != state.EVENTS:
+            state.EVENTS = events
+            self.selector.modify(state.CONN,events,self.session_ready)
+
+    def close_if_done(self,state:TCPServerState):
+        #QUIT waits for in-flight transfers, and for its replies to get out
+        if not state.ACTIVE and state.PENDING == 0 and not state.OUTBOX:
+            self.close_session(state)
+
+    def handle_line(self,state:TCPServerState,nextline:str)->bytes:
+        logging.info("command received:\n%s",nextline)
+        self.commands += 1
+        self.transcript.write((nextline + "\n").encode('utf-8'))
+        pending = state.PENDING
+        start = time.perf_counter()
+        reply = parseCommand(state,nextline,include_command=False);
+        if self.metrics is not None: #every reply starts with its code, a deferred RETR's with 150
+            self.metrics.command(nextline.split(" ",1)[0].rstrip("\r").upper(),time.perf_counter() - start,int(reply[:3]))
+        if state.PENDING > pending: #RETR went to the transfer pool: answer 150, start_transfer held a place for the rest
+            return TRANSFER_STARTED
+        return reply
+
+    def echo_reply(self,reply:bytes)->bytes:
+        if log.isEnabledFor(logging.INFO):
+            logging.info("Reply sent (%d character(s)):\n%s",len(reply),reply.decode('utf-8'))
+        self.transcript.write(reply)
+        return reply
+
+    def transfer_done(self,state:TCPServerState,slot:PendingReply,reply:bytes):
+        #called on a transfer worker thread
+        self.finished.put((state,slot,reply))
+        self.wakeup_send.send(b"\0")
+
+    def deliver_transfers(self,wakeup:socket.socket,mask:int):
+        try:
+            while wakeup.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
         while True:
-            if not SERVER_STATE.ACTIVE:
-                SERVER_STATE.reset_state()
+            try:
+                state,slot,reply = self.finished.get_nowait()
+            except queue.Empty:
                 break
+            state.PENDING -= 1
+            slot.reply = reply
+            if state.CONN is None or state.CONN not in self.sessions: #session already gone
+                continue
+            state.LAST_ACTIVE = time.monotonic() #the idle clock starts when the transfer's done
+            #whatever is at the front of the queue and done goes out, up to the next transfer
+            #still running; a later transfer that finished first waits for the earlier ones
+            ready = []
+            while state.REPLIES:
+                head = state.REPLIES[0]
+                if isinstance(head,PendingReply):
+                    if head.reply is None:
+                        break
+                    head = head.reply
+                else:
+                    state.HELD -= len(head)
+                state.REPLIES.popleft()
+                ready.append(self.echo_reply(head))
+            if ready:
+                self.send(state,b"".join(ready))
+            if state.CONN is not None:
+                self.handle_lines(state) #lines left waiting while held replies were over the mark
+
+    def close_session(self,state:TCPServerState):
+        conn = state.CONN
+        if conn is not None and conn in self.sessions:
+            self.selector.unregister(conn)
+            del self.sessions[conn]
+        state.reset_state()
+        state.CONN = None
+        logging.info("client %s disconnected",state.PEER)
+
+    def serve_once(self,timeout:float|None=1):
+        for key,mask in self.selector.select(timeout): #timeout for keyboardinterrupt reasons
+            key.data(key.fileobj,mask)
+        self.transcript.tick()
+        if self.idle_timeout and time.monotonic() >= self.next_idle_check:
+            self.close_idle()
+
+    def close_idle(self):
+        now = time.monotonic()
+        self.next_idle_check = now + min(1.0,self.idle_timeout)
+        for state in list(self.sessions.values()):
+            if state.PENDING == 0 and now - state.LAST_ACTIVE > self.idle_timeout: #a running transfer isn't idle
+                logging.info("closing idle session %s",state.PEER)
+                self.sessions_idled += 1
+                try: #best effort: it may be idle because it stopped reading
+                    state.CONN.send(bytes(state.OUTBOX) + self.echo_reply(FTPReply.idle.bytes()))
+                except OSError:
+                    pass
+                self.close_session(state)
+
+    def counters(self)->dict[str,int]:
+        #running totals, for adding up across worker processes
+        counts = {"sessions":self.sessions_opened,"open_sessions":len(self.sessions),"commands":self.commands,
+                  "sessions_rejected":self.sessions_rejected,"sessions_idled":self.sessions_idled,
+                  "transfers":self.transfers.completed,"transfers_failed":self.transfers.failed}
+        if self.files is not None:
+            counts.update(file_hits=self.files.hits,file_misses=self.files.misses)
+        return counts
+
+    def close(self):
+        if self.metrics_endpoint is not None:
+            self.metrics_endpoint.close()
+        for state in list(self.sessions.values()):
+            self.close_session(state)
+        self.transfers.shutdown()
+        self.data_ports.close()
+        if self.files is not None:
+            logging.info("%s",self.files)
+            self.files.close()
+        self.transcript.close()
+        self.selector.close()
+        self.wakeup_recv.close()
+        self.wakeup_send.close()
+        self.SERVERSOCK.close()
+
+
+def start_FTP_server(server:FTPServer):
+    logging.info("Opening FTP server")
+    while True:
+        server.serve_once()
+
+#--workers N: N forked copies of the server, each with its own listening socket on the same port
+#(SO_REUSEPORT, so the kernel spreads new connections across them) and so its own core.
+#the supervisor serves nothing itself: it forks the workers, forks a new one whenever one dies,
+#and adds up the counters each worker writes back over a pipe (a JSON line every stats_interval and one on exit)
+class Supervisor:
+    RESTART_BACKOFF = 1.0 #a worker that died younger than this is restarted only after this long
+
+    def __init__(self,workers:int,port:int,start_worker:Callable[[int,int,int],None],stats_interval:float=10.0):
+        #start_worker(index,port,report_fd) runs in the forked child and serves until told to stop
+        self.workers = workers
+        self.start_worker = start_worker
+        self.stats_interval = stats_interval
+        #bound but never listening: keeps the port (and resolves port 0) for every worker, gets no connections
+        self.placeholder = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+        self.placeholder.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+        self.placeholder.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEPORT,1)
+        self.placeholder.bind(("",port))
+        self.port:int = self.placeholder.getsockname()[1]
+        self.selector = selectors.DefaultSelector()
+        self.pids:dict[int,int] = {} #pid -> worker index
+        self.started:dict[int,float] = {}
+        self.latest:dict[int,dict[str,int]] = {} #report pipe -> the last counters read from it
+        self.buffers:dict[int,bytes] = {}
+        self.retired:Counter[str] = Counter() #counters of worker processes that are gone
+        self.restarts = 0
+        self.stopping = False
+
+    def spawn(self,index:int):
+        read_fd,write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
             try:
-                logging.info("awaiting next command")
-                while True:
-                    #update command buffer
-                    conn.settimeout(5)
-                    try:
-                        data = conn.recv(1024,).decode('utf-8')
-                        if len(data) == 0: #port closed! close server
-                            logging.info("Port closed! Resetting server...")
-                            raise PortClosed()
-                        commands += data
-                    except TimeoutError:
-                        continue
-
-                    #find line
-                    idx = re.search("\n",commands)
-                    if idx == None:
-                        #enter not received, keep polling
-                        time.sleep(0.1)
-                        continue
-                    idx = idx.start()
-                    nextline,commands = commands[:idx],commands[idx+1:]
-                    break;
-
-                logging.info("command received:\n" + nextline) 
-                sys.stdout.buffer.write((nextline + "\n").encode('utf-8'))
-                sys.stdout.flush()
-                reply = parseCommand(nextline,include_command=False);
-                conn.send(reply.encode('utf-8'))
-                logging.info(f"Reply sent ({len(reply)} character(s)):\n" + reply)
-                sys.stdout.buffer.write(reply.encode('utf-8'))
-                sys.stdout.flush()
-                
-            except FTPError as f:
-                logging.error("FTP Error: " + f.reply())
-                conn.send(f.reply().encode('utf-8'))
-                sys.stdout.buffer.write(f.reply().encode('utf-8'))
-                sys.stdout.flush()
+                os.close(read_fd)
+                for fd in list(self.buffers): #the other workers' pipes
+                    os.close(fd)
+                self.placeholder.close()
+                self.start_worker(index,self.port,write_fd)
+                code = 0
+            except BaseException:
+                logging.exception("worker %d failed",index)
+            finally:
+                os._exit(code) #never back into the supervisor's loop
+        os.close(write_fd)
+        os.set_blocking(read_fd,False)
+        self.selector.register(read_fd,selectors.EVENT_READ)
+        self.buffers[read_fd] = b""
+        self.pids[pid] = index
+        self.started[index] = time.monotonic()
+        logging.info("worker %d started, pid %d",index,pid)
+
+    def read_reports(self,fd:int):
+        try:
+            data = os.read(fd,65536)
+        except BlockingIOError:
+            return
+        if not data: #worker gone; whatever it reported last is now history
+            self.selector.unregister(fd)
+            os.close(fd)
+            del self.buffers[fd]
+            #except its gauges, which count for nothing now: the sessions it had open died with it
+            self.retired.update({name:0 if name.startswith("open_") else value for name,value in self.latest.pop(fd,{}).items()})
+            return
+        *lines,self.buffers[fd] = (self.buffers[fd] + data).split(b"\n")
+        if lines:
+            self.latest[fd] = json.loads(lines[-1])
+
+    def reap(self):
+        while self.pids:
+            pid,status = os.waitpid(-1,os.WNOHANG)
+            if pid == 0:
+                return
+            index = self.pids.pop(pid)
+            if self.stopping:
                 continue
-            except PortClosed:
-                SERVER_STATE.reset_state()
-        
-        # print("server disconnected")
-        logging.info("client disconnected")
-
-
-    return reply
+            logging.warning("worker %d (pid %d) exited with status %d, restarting",index,pid,os.waitstatus_to_exitcode(status))
+            self.restarts += 1
+            if time.monotonic() - self.started[index] < self.RESTART_BACKOFF: #don't spin on a worker that can't start
+                time.sleep(self.RESTART_BACKOFF)
+            self.spawn(index)
+
+    def totals(self)->Counter[str]:
+        totals = Counter(self.retired)
+        for counts in self.latest.values():
+            totals.update(counts)
+        totals["workers"] = len(self.pids)
+        totals["restarts"] = self.restarts
+        return totals
+
+    def stop(self,*_):
+        self.stopping = True
+        for pid in self.pids:
+            try:
+                os.kill(pid,signal.SIGTERM)
+            except ProcessLookupError:
+                pass
 
-# def reset_server():
+    def run(self):
+        signal.signal(signal.SIGTERM,self.stop)
+        signal.signal(signal.SIGINT,self.stop)
+        for index in range(self.workers):
+            self.spawn(index)
+        logging.info("supervising %d workers on port %d",self.workers,self.port)
+        next_log = time.monotonic() + self.stats_interval
+        while self.pids or self.buffers: #until every worker is reaped and its last report read
+            for key,_ in self.selector.select(0.2):
+                self.read_reports(key.fd)
+            self.reap()
+            if time.monotonic() >= next_log:
+                logging.info("workers: %s",json.dumps(self.totals()))
+                next_log += self.stats_interval
+        logging.info("workers stopped: %s",json.dumps(self.totals()))
+        self.selector.close()
+        self.placeholder.close()
+
+def serve_worker(server:FTPServer,report_fd:int,stats_interval:float):
+    #a worker's loop: serve, and every stats_interval (and on the way out) tell the supervisor the counters
+    with open(report_fd,"w") as report:
+        def send_report():
+            report.write(json.dumps(server.counters()) + "\n")
+            report.flush()
+        next_report = time.monotonic() + stats_interval
+        try:
+            while True:
+                try:
+                    server.serve_once(min(1.0,stats_interval))
+                except (ConnectionResetError,ConnectionAbortedError):
+                    continue
+                if time.monotonic() >= next_report:
+                    send_report()
+                    next_report += stats_interval
+        except SystemExit: #SIGTERM from the supervisor
+            pass
+        finally:
+            send_report()
+            server.close()
     
 
 
@@ -474,32 +1599,85 @@ def start_FTP_server():
 
 
 if __name__ == "__main__":
-    server_type:Literal['local','networked'] = "networked"
-
-    logging.basicConfig(filename='server.log', level=logging.INFO,filemode='w')
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("port",type=int,nargs="?")
+    argparser.add_argument("--local",action="store_true",help="run one session from stdin to stdout instead of listening on port")
+    argparser.add_argument("--transfer-workers",type=int,default=8,help="threads running RETR data transfers")
+    argparser.add_argument("--log-level",choices=LEVELS,default="INFO")
+    argparser.add_argument("--log-sample",type=int,default=1,metavar="N",help="only log 1 in N records below WARNING")
+    argparser.add_argument("--log-sync",action="store_true",help="write server.log from the server loop instead of a background thread")
+    argparser.add_argument("--pasv-ports",type=int,default=16,help="listening data ports bound up front for PASV/EPSV")
+    argparser.add_argument("--pasv-address",default=None,help="address advertised in PASV replies (e.g. the public address behind NAT)")
+    argparser.add_argument("--open-files",type=int,default=256,help="RETR files kept open between requests (0 disables the cache)")
+    argparser.add_argument("--open-files-valid",type=float,default=1.0,metavar="SECONDS",help="how long a cached file is trusted before its path is re-checked")
+    argparser.add_argument("--hot-bytes",type=int,default=0,help="memory for keeping popular small files ready to send (0 disables; needs --open-files)")
+    argparser.add_argument("--deflate-level",type=int,default=6,choices=range(0,10),metavar="0-9",help="zlib level for MODE Z transfers")
+    argparser.add_argument("--hot-max-file",type=int,default=64*1024,metavar="BYTES",help="largest file the hot tier takes")
+    argparser.add_argument("--max-sessions",type=int,default=0,help="sessions served at once, more get 421 (0: no limit; per worker)")
+    argparser.add_argument("--idle-timeout",type=float,default=0,metavar="SECONDS",help="close sessions quiet this long (0: never)")
+    argparser.add_argument("--session-rate",type=int,default=0,metavar="KB/S",help="RETR bandwidth cap per session (0: none)")
+    argparser.add_argument("--total-rate",type=int,default=0,metavar="KB/S",help="RETR bandwidth cap for all sessions together (0: none; per worker)")
+    argparser.add_argument("--workers",type=int,default=0,metavar="N",help="fork N server processes sharing the port (SO_REUSEPORT); 0 serves in this process")
+    argparser.add_argument("--metrics-port",type=int,default=None,metavar="PORT",help="serve Prometheus metrics at http://127.0.0.1:PORT/metrics (worker i of --workers on PORT+i)")
+    argparser.add_argument("--no-metrics",action="store_true",help="keep no metrics (STAT replies 500)")
+    argparser.add_argument("--stats-interval",type=float,default=10.0,metavar="SECONDS",help="how often --workers report their counters")
+    add_transcript_arguments(argparser)
+    args = argparser.parse_args()
+
+    server_type:Literal['local','networked'] = "local" if args.local else "networked"
 
     if server_type == "local":
+        setup_logging('server.log',args.log_level,background=not args.log_sync,sample=args.log_sample)
 
-        SERVER_STATE = ServerState()
-
-        import sys
-        text = sys.stdin.buffer.read().decode('UTF-8');
+        state = ServerState()
 
-        
-
-        sys.stdout.buffer.write(parseCommands(text).encode('UTF-8'))
+        #decoded and parsed as it arrives, every reply written as soon as it's made
+        stdin = io.TextIOWrapper(sys.stdin.buffer,encoding='UTF-8',newline="\n")
+        stdout = sys.stdout.buffer
+        for reply in serveCommands(state,stdin):
+            stdout.write(reply)
+        stdout.flush()
     
     elif server_type == "networked":
-        import sys
-        port = int(sys.argv[1])
-
-        SERVER_STATE = TCPServerState(SERVER_PORT=port)
+        if args.port is None:
+            argparser.error("a port is needed unless --local")
+
+        def make_server(port:int,reuse_port:bool=False,metrics_port:int|None=args.metrics_port)->FTPServer:
+            return FTPServer(port,transfer_workers=args.transfer_workers,transcript=transcript_from_arguments(args),
+                             data_ports=args.pasv_ports,pasv_address=args.pasv_address,
+                             open_files=args.open_files,open_files_valid=args.open_files_valid,
+                             hot_bytes=args.hot_bytes,hot_max_file=args.hot_max_file,deflate_level=args.deflate_level,
+                             reuse_port=reuse_port,max_sessions=args.max_sessions,idle_timeout=args.idle_timeout,
+                             session_rate=args.session_rate*1024,total_rate=args.total_rate*1024,
+                             metrics=not args.no_metrics,metrics_port=metrics_port)
+
+        if args.workers > 0:
+            pipeline = setup_logging('server.log',args.log_level,background=not args.log_sync,sample=args.log_sample)
+
+            def start_worker(index:int,port:int,report_fd:int):
+                #the supervisor's log pipeline didn't survive the fork (its thread is gone); each worker logs to its own file
+                logging.getLogger().removeHandler(pipeline.handler)
+                worker_log = setup_logging(f'server.worker{index}.log',args.log_level,background=not args.log_sync,sample=args.log_sample)
+                signal.signal(signal.SIGINT,signal.SIG_IGN) #ctrl-c reaches the whole group; the supervisor decides
+                signal.signal(signal.SIGTERM,lambda *_: sys.exit(0))
+                try:
+                    metrics_port = None if args.metrics_port is None else args.metrics_port + index
+                    serve_worker(make_server(port,reuse_port=True,metrics_port=metrics_port),report_fd,args.stats_interval)
+                finally:
+                    worker_log.stop()
+
+            Supervisor(args.workers,args.port,start_worker,args.stats_interval).run()
+            sys.exit(0)
+
+        setup_logging('server.log',args.log_level,background=not args.log_sync,sample=args.log_sample)
+        signal.signal(signal.SIGTERM,lambda *_: sys.exit(0)) #so buffered transcript/log output gets flushed on the way out
+
+        server = make_server(args.port)
 
         while True:
             try:
-                start_FTP_server()
+                start_FTP_server(server)
             except (ConnectionResetError,ConnectionAbortedError):
                 # print("Connection broken! Restarting server...")
-                SERVER_STATE.reset_state()
                 continue
         
\ No newline at end of file
@@ -0,0 +1,111 @@
+#shared helpers for the benchmark scripts in this folder
+#each benchmark runs FTP_Server.py as a real subprocess (stdout discarded) in a scratch directory,
+#so the numbers include the whole networking path and nothing leaks into the repo's server.log
+
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0,str(REPO))
+
+#point FTP_BENCH_SERVER (FTP_BENCH_CLIENT) at another copy of the server (client), e.g. an older release, to compare against it
+SERVER = Path(os.environ.get("FTP_BENCH_SERVER",REPO/"FTP_Server.py"))
+CLIENT = Path(os.environ.get("FTP_BENCH_CLIENT",REPO/"FTP_Client.py"))
+
+def free_port()->int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1",0))
+        return s.getsockname()[1]
+
+@contextlib.contextmanager
+def running_server(*args:str,cwd:str|Path|None=None,stdout=subprocess.DEVNULL):
+    #yields (port, workdir) for a server listening on localhost
+    with contextlib.ExitStack() as stack:
+        if cwd is None:
+            cwd = stack.enter_context(tempfile.TemporaryDirectory())
+        port = free_port()
+        proc = subprocess.Popen([sys.executable,str(SERVER),str(port),*args],cwd=cwd,stdout=stdout)
+        try:
+            deadline = time.monotonic() + 10
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1",port),timeout=1).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline or proc.poll() is not None:
+                        raise RuntimeError("server did not come up")
+                    time.sleep(0.05)
+            yield port,Path(cwd)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+class Session:
+    #minimal blocking control-connection client, one reply line at a time
+    def __init__(self,port:int,host:str="127.0.0.1"):
+        self.sock = socket.create_connection((host,port))
+        self.buff = bytearray()
+        self.greeting = self.line()
+
+    def line(self)->bytes:
+        while True:
+            idx = self.buff.find(b"\n")
+            if idx != -1:
+                line = bytes(self.buff[:idx+1])
+                del self.buff[:idx+1]
+                return line
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError("server closed the control connection")
+            self.buff += data
+
+    def command(self,command:str,lines:int=1)->list[bytes]:
+        self.sock.sendall(command.encode() + b"\r\n")
+        return [self.line() for _ in range(lines)]
+
+    def data_listener(self)->tuple[socket.socket,str]:
+        #active-mode data port for this session, plus the PORT command announcing it
+        listener = socket.socket()
+        listener.bind(("127.0.0.1",0))
+        listener.listen(8)
+        port = listener.getsockname()[1]
+        return listener,f"PORT 127,0,0,1,{port//256},{port%256}"
+
+    def passive(self)->tuple[str,int]:
+        #PASV, returning the data address to connect to
+        reply = self.command("PASV")[0].decode()
+        nums = list(map(int,reply[reply.index("(")+1:reply.index(")")].split(",")))
+        return ".".join(map(str,nums[:4])),nums[4]*256 + nums[5]
+
+    def login(self):
+        self.command("USER anonymous")
+        self.command("PASS guest@")
+
+    def close(self):
+        with contextlib.suppress(OSError):
+            self.command("QUIT")
+        self.sock.close()
+
+def drain(conn:socket.socket,delay:float=0.0)->int:
+    #read a data connection to EOF, optionally pausing between reads to simulate a slow link
+    total = 0
+    with conn:
+        while True:
+            data = conn.recv(65536)
+            if not data:
+                return total
+            total += len(data)
+            if delay:
+                time.sleep(delay)
+
+def percentile(samples:list[float],p:float)->float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered)-1,int(p/100*len(ordered)))]
@@ -0,0 +1,75 @@
+#N fetch jobs (connect, login, GET one file, quit) spread over several servers:
+#one FTP_Client.py process per job, all at once, against one process running N AsyncFTPClients
+#usage: python bench/bench_async.py [servers] [file-KB] [repeats]
+
+import asyncio
+import contextlib
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import CLIENT, free_port, running_server
+
+from FTP_Async import AsyncFTPClient
+
+JOBS = [8,32,64]
+
+def run_processes(ports:list[int],jobs:int,clientdir:str):
+    procs = []
+    for i in range(jobs):
+        workdir = os.path.join(clientdir,f"job{i}")
+        os.makedirs(workdir,exist_ok=True)
+        script = f"CONNECT localhost {ports[i % len(ports)]}\r\nGET payload.bin\r\nQUIT\r\n"
+        proc = subprocess.Popen([sys.executable,str(CLIENT),str(free_port()),"--transcript","off","--log-level","OFF"],
+                                cwd=workdir,stdin=subprocess.PIPE,stdout=subprocess.DEVNULL)
+        proc.stdin.write(script.encode())
+        proc.stdin.close()
+        procs.append(proc)
+    for proc in procs:
+        if proc.wait() != 0:
+            raise RuntimeError("client failed")
+
+async def fetch(port:int,destination:str)->int:
+    async with AsyncFTPClient() as ftp:
+        await ftp.connect("localhost",port)
+        await ftp.login()
+        received = await ftp.get("payload.bin",destination)
+        await ftp.quit()
+        return received
+
+async def run_async(ports:list[int],jobs:int,clientdir:str,size:int):
+    received = await asyncio.gather(*(fetch(ports[i % len(ports)],os.path.join(clientdir,f"async{i}.bin")) for i in range(jobs)))
+    assert all(n == size for n in received)
+
+def main():
+    servers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    kilobytes = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    logging.disable(logging.CRITICAL)
+    with contextlib.ExitStack() as stack:
+        ports = []
+        for _ in range(servers):
+            port,workdir = stack.enter_context(running_server("--transcript","off","--log-level","OFF"))
+            (workdir/"payload.bin").write_bytes(os.urandom(kilobytes*1024))
+            ports.append(port)
+
+        print(f"{servers} servers, {kilobytes} KB per job")
+        print(f"{'jobs':<6} {'processes s':>12} {'async s':>9} {'speedup':>8}")
+        for jobs in JOBS:
+            best_procs = best_async = float("inf")
+            for _ in range(repeats):
+                with tempfile.TemporaryDirectory() as clientdir:
+                    start = time.perf_counter()
+                    run_processes(ports,jobs,clientdir)
+                    best_procs = min(best_procs,time.perf_counter() - start)
+                with tempfile.TemporaryDirectory() as clientdir:
+                    start = time.perf_counter()
+                    asyncio.run(run_async(ports,jobs,clientdir,kilobytes*1024))
+                    best_async = min(best_async,time.perf_counter() - start)
+            print(f"{jobs:<6} {best_procs:>12.3f} {best_async:>9.3f} {best_procs/best_async:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
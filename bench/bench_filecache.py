@@ -0,0 +1,88 @@
+#RETR rate for many requests over a few hundred small files, with the server's open-file cache off and on,
+#then the per-RETR file work on its own (exists + open + close against FileCache.acquire + release)
+#usage: python bench/bench_filecache.py [retrs-per-client] [clients]
+
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from _common import Session, percentile, running_server
+
+from FTP_Server import FileCache
+
+FILES = 200
+FILE_SIZE = 4096
+DEPTH = "srv/pub/data/archive/2024" #a few directories for every lookup to walk
+
+def run_client(port:int,retrs:int,latencies:list[float],barrier:threading.Barrier):
+    session = Session(port)
+    session.login()
+    rng = random.Random()
+    barrier.wait()
+    for _ in range(retrs):
+        path = f"{DEPTH}/file{rng.randrange(FILES)}.bin"
+        start = time.perf_counter()
+        address = session.passive()
+        with socket.create_connection(address) as conn:
+            session.sock.sendall(f"RETR {path}\r\n".encode())
+            received = 0
+            while data := conn.recv(65536):
+                received += len(data)
+        session.line(),session.line()
+        latencies.append(time.perf_counter() - start)
+        assert received == FILE_SIZE
+    session.close()
+
+def main():
+    retrs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    print(f"{'open-files':>10} {'RETR/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for open_files in [0,256]:
+        with running_server("--open-files",str(open_files),"--log-level","OFF") as (port,workdir):
+            (workdir/DEPTH).mkdir(parents=True)
+            for n in range(FILES):
+                (workdir/DEPTH/f"file{n}.bin").write_bytes(bytes(FILE_SIZE))
+            latencies:list[float] = []
+            barrier = threading.Barrier(clients+1)
+            threads = [threading.Thread(target=run_client,args=(port,retrs,latencies,barrier)) for _ in range(clients)]
+            for t in threads:
+                t.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+            print(f"{open_files:>10} {len(latencies)/elapsed:>8.0f} "
+                  f"{percentile(latencies,50)*1000:>8.3f} {percentile(latencies,99)*1000:>8.3f}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.makedirs(DEPTH)
+        paths = [f"{DEPTH}/file{n}.bin" for n in range(FILES)]
+        for path in paths:
+            with open(path,"wb") as f:
+                f.write(bytes(FILE_SIZE))
+        rng = random.Random(0)
+        picks = [rng.choice(paths) for _ in range(200_000)]
+
+        start = time.perf_counter()
+        for path in picks:
+            if os.path.exists(path):
+                with open(path,"rb"):
+                    pass
+        uncached = (time.perf_counter() - start)/len(picks)
+
+        cache = FileCache(256)
+        start = time.perf_counter()
+        for path in picks:
+            cache.acquire(path).release()
+        cached = (time.perf_counter() - start)/len(picks)
+        cache.close()
+        print(f"file work per RETR: exists+open+close {uncached*1e6:.2f} us, cache {cached*1e6:.2f} us ({cache})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#reply latency for commands arriving in one segment vs split across segments
+#usage: python bench/bench_framing.py [samples]
+#FTP_BENCH_SERVER=/path/to/old/FTP_Server.py runs the same measurements against another server
+
+import socket
+import sys
+import time
+
+from _common import Session, percentile, running_server
+
+def timed(session:Session,fragments:list[bytes],gap:float)->float:
+    #latency measured from the last fragment leaving to the reply arriving
+    for fragment in fragments[:-1]:
+        session.sock.sendall(fragment)
+        time.sleep(gap)
+    start = time.perf_counter()
+    session.sock.sendall(fragments[-1])
+    session.line()
+    return time.perf_counter() - start
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    long_user = b"USER " + b"x"*2000 + b"\r\n"
+    cases = {
+        "coalesced NOOP":([b"NOOP\r\n"],0),
+        "split NOOP (2 segments)":([b"NO",b"OP\r\n"],0.005),
+        "split CRLF (CR|LF)":([b"NOOP\r",b"\n"],0.005),
+        "2 KB USER in 64 B segments":([long_user[i:i+64] for i in range(0,len(long_user),64)],0.0005),
+    }
+    with running_server() as (port,_):
+        session = Session(port)
+        session.sock.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+        session.login()
+        print(f"{'case':<28} {'p50 ms':>8} {'p99 ms':>8}")
+        for name,(fragments,gap) in cases.items():
+            latencies = [timed(session,fragments,gap) for _ in range(samples)]
+            print(f"{name:<28} {percentile(latencies,50)*1000:>8.3f} {percentile(latencies,99)*1000:>8.3f}")
+        session.close()
+
+if __name__ == "__main__":
+    main()
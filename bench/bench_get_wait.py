@@ -0,0 +1,57 @@
+#how long an active-mode GET (PORT + RETR) takes to come back in its three outcomes:
+#  ok   the server connects and sends a small file
+#  550  RETR refused straight away (no such file)
+#  425  the server can't connect (PORT names a port nobody listens on) and says so with 150, then 425
+#the GET used to notice the last two only when its 5 s accept timeout ran out
+#FTP_BENCH_CLIENT points it at another copy of FTP_Client.py
+#usage: python bench/bench_get_wait.py [repeats]
+
+import importlib.util
+import logging
+import os
+import socket
+import sys
+import tempfile
+import time
+
+from _common import CLIENT, free_port, percentile, running_server
+
+from FTP_Transcript import NullTranscript
+
+def load_client():
+    spec = importlib.util.spec_from_file_location("bench_client",CLIENT)
+    client = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(client)
+    return client
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    logging.disable(logging.CRITICAL)
+    client = load_client()
+    client.TRANSCRIPT = NullTranscript()
+    generate_get_output = client.generate_get_output
+    with running_server() as (port,workdir),tempfile.TemporaryDirectory() as clientdir:
+        (workdir/"small.txt").write_bytes(b"x"*1024)
+        os.chdir(clientdir) #retr_files/ lands here
+        conn = socket.create_connection(("127.0.0.1",port))
+        list(client.send_commands(conn,[None]))
+        list(client.send_commands(conn,client.generate_connect_output()))
+
+        print(f"{CLIENT}")
+        print(f"{'outcome':<8} {'p50 ms':>9} {'max ms':>9}")
+        for outcome,path,expect in [("ok","small.txt",1),("550","missing.txt",0),("425","small.txt",0)]:
+            if outcome == "425": #PORT points somewhere else than the port the GET listens on
+                dead = free_port()
+                client.generate_get_output = lambda _,file_path,*args: generate_get_output(dead,file_path,*args)
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                copied = client.process_get(conn,free_port(),path,1)
+                samples.append(time.perf_counter() - start)
+                assert copied == expect
+            client.generate_get_output = generate_get_output
+            print(f"{outcome:<8} {percentile(samples,50)*1000:>9.1f} {max(samples)*1000:>9.1f}")
+        list(client.send_commands(conn,["QUIT\r\n"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#tail latency of RETRs under a Zipf-distributed request mix over many small files:
+#no file cache, the open-file cache, and the open-file cache with the in-memory hot tier.
+#end to end first, then the server's send path on its own (path -> bytes on a socket) in-process
+#usage: python bench/bench_hotfiles.py [retrs-per-client] [clients] [zipf-s]
+
+import itertools
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from _common import Session, drain, percentile, running_server
+
+from FTP_Server import FileCache
+
+FILES = 1000
+CONFIGS = [
+    ("no cache",["--open-files","0"]),
+    ("open files",["--open-files","256"]),
+    ("hot tier",["--open-files","256","--hot-bytes",str(8*1024*1024)]),
+]
+
+def size_of(n:int)->int:
+    return 1024 + (n*7919) % (31*1024) #1-32 KB, spread evenly over the popularity ranks
+
+def run_client(port:int,retrs:int,weights:list[float],latencies:list[float],barrier:threading.Barrier):
+    session = Session(port)
+    session.login()
+    picks = random.choices(range(FILES),cum_weights=weights,k=retrs)
+    barrier.wait()
+    for n in picks:
+        start = time.perf_counter()
+        address = session.passive()
+        with socket.create_connection(address) as conn:
+            session.sock.sendall(f"RETR pub/file{n}.bin\r\n".encode())
+            received = 0
+            while data := conn.recv(65536):
+                received += len(data)
+        session.line(),session.line()
+        latencies.append(time.perf_counter() - start)
+        assert received == size_of(n)
+    session.close()
+
+def main():
+    retrs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    s = float(sys.argv[3]) if len(sys.argv) > 3 else 1.1
+    weights = list(itertools.accumulate(1/(k+1)**s for k in range(FILES)))
+    print(f"{'server':<12} {'RETR/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9}")
+    for name,args in CONFIGS:
+        with running_server(*args,"--log-level","OFF") as (port,workdir):
+            (workdir/"pub").mkdir()
+            for n in range(FILES):
+                (workdir/"pub"/f"file{n}.bin").write_bytes(bytes(size_of(n)))
+            latencies:list[float] = []
+            barrier = threading.Barrier(clients+1)
+            threads = [threading.Thread(target=run_client,args=(port,retrs,weights,latencies,barrier)) for _ in range(clients)]
+            for t in threads:
+                t.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<12} {len(latencies)/elapsed:>8.0f} {percentile(latencies,50)*1000:>8.3f} "
+                  f"{percentile(latencies,99)*1000:>8.3f} {percentile(latencies,99.9)*1000:>9.3f}")
+
+    print()
+    print(f"{'send path':<12} {'p50 us':>8} {'p99 us':>8} {'p99.9 us':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.mkdir("pub")
+        for n in range(FILES):
+            with open(f"pub/file{n}.bin","wb") as f:
+                f.write(bytes(size_of(n)))
+        picks = random.choices(range(FILES),cum_weights=weights,k=50_000)
+        for name,cache in [("no cache",None),("open files",FileCache(256)),("hot tier",FileCache(256,hot_bytes=8*1024*1024))]:
+            sender,receiver = socket.socketpair()
+            reader = threading.Thread(target=drain,args=(receiver,))
+            reader.start()
+            samples = []
+            for n in picks:
+                path = f"pub/file{n}.bin"
+                start = time.perf_counter()
+                if cache is None:
+                    if os.path.exists(path):
+                        with open(path,"rb") as f:
+                            sender.sendfile(f,0)
+                else:
+                    entry = cache.acquire(path)
+                    if entry.data is not None:
+                        sender.sendall(memoryview(entry.data))
+                    else:
+                        sender.sendfile(entry.file,0)
+                    entry.release()
+                samples.append(time.perf_counter() - start)
+            sender.close()
+            reader.join()
+            print(f"{name:<12} {percentile(samples,50)*1e6:>8.1f} {percentile(samples,99)*1e6:>8.1f} "
+                  f"{percentile(samples,99.9)*1e6:>9.1f}")
+
+if __name__ == "__main__":
+    main()
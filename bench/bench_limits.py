@@ -0,0 +1,113 @@
+#control-connection latency under overload: NOOP round trips on one interactive session while
+#bulk sessions keep RETRing a large file, with the server unlimited and with bandwidth caps on;
+#then how long a small RETR waits while capped transfers outnumber the transfer workers, and
+#how fast a session past --max-sessions hears its 421
+#usage: python bench/bench_limits.py [bulk-sessions] [seconds] [file-MB]
+
+import os
+import socket
+import sys
+import threading
+import time
+
+from _common import Session, drain, percentile, running_server
+
+def bulk(port:int,stop:threading.Event,moved:list[int]):
+    session = Session(port)
+    session.login()
+    try:
+        while not stop.is_set():
+            data = socket.create_connection(session.passive())
+            session.sock.sendall(b"RETR big.bin\r\n")
+            moved.append(drain(data))
+            session.line()
+            session.line()
+    finally:
+        session.close()
+
+def measure(port:int,sessions:int,seconds:float)->tuple[list[float],float]:
+    #NOOP round trips, and the bulk sessions' MB/s
+    stop = threading.Event()
+    moved:list[int] = []
+    threads = [threading.Thread(target=bulk,args=(port,stop,moved)) for _ in range(sessions)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5) #let the transfers get going
+    probe = Session(port)
+    probe.login()
+    samples = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        probe.command("NOOP")
+        samples.append(time.perf_counter() - start)
+        time.sleep(0.01)
+    probe.close()
+    stop.set()
+    for thread in threads: #each finishes the file it's on
+        thread.join()
+    return samples,sum(moved)/1e6/(time.perf_counter() - began)
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    megabytes = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    common = ("--transcript","off","--log-level","OFF")
+    print(f"{sessions} bulk sessions RETRing {megabytes} MB over and over, NOOP every 10 ms for {seconds:.0f} s")
+    print(f"{'limits':<34} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'bulk MB/s':>10}")
+    for name,args in [("none",()),
+                      ("--session-rate 51200",("--session-rate","51200")),
+                      ("--total-rate 102400",("--total-rate","102400"))]:
+        with running_server(*common,*args) as (port,workdir):
+            with open(workdir/"big.bin","wb") as f:
+                for _ in range(megabytes):
+                    f.write(os.urandom(1024*1024))
+            samples,rate = measure(port,sessions,seconds)
+        print(f"{name:<34} {percentile(samples,50)*1000:>8.2f} {percentile(samples,99)*1000:>8.2f} "
+              f"{max(samples)*1000:>8.2f} {rate:>10.0f}")
+
+    #capped transfers waiting for tokens don't hold a worker, so a small RETR gets one straight away
+    with running_server(*common,"--transfer-workers","2","--session-rate","64") as (port,workdir):
+        with open(workdir/"big.bin","wb") as f:
+            f.write(os.urandom(256*1024)) #4 s each at 64 KB/s
+        with open(workdir/"small.bin","wb") as f:
+            f.write(os.urandom(100))
+        stop = threading.Event()
+        threads = [threading.Thread(target=bulk,args=(port,stop,[])) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        session = Session(port)
+        session.login()
+        samples = []
+        for _ in range(20):
+            data = socket.create_connection(session.passive())
+            start = time.perf_counter()
+            session.sock.sendall(b"RETR small.bin\r\n")
+            drain(data)
+            session.line()
+            session.line()
+            samples.append(time.perf_counter() - start)
+        session.close()
+        stop.set()
+        for thread in threads:
+            thread.join()
+    print(f"100-byte RETR beside 4 capped 256 KB RETRs, 2 transfer workers: p50 {percentile(samples,50)*1000:.2f} ms, "
+          f"max {max(samples)*1000:.2f} ms")
+
+    with running_server(*common,"--max-sessions","4") as (port,_):
+        held = [Session(port) for _ in range(4)]
+        samples = []
+        for _ in range(200):
+            start = time.perf_counter()
+            turned_away = Session(port)
+            samples.append(time.perf_counter() - start)
+            assert turned_away.greeting.startswith(b"421")
+            turned_away.sock.close()
+        for session in held:
+            session.close()
+    print(f"421 past --max-sessions 4: p50 {percentile(samples,50)*1000:.2f} ms, p99 {percentile(samples,99)*1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#local (stdin) mode on command replays of growing length: the --local server process's time and peak memory,
+#and parseCommands in-process (FTP_BENCH_SERVER can point both at an older server to compare against)
+#usage: python bench/bench_local.py [--max-lines N] [--max-lines-inprocess N]
+
+import argparse
+import importlib.util
+import io
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import SERVER
+
+SIZES = [10_000,100_000,1_000_000,10_000_000]
+LOGIN = "USER anonymous\r\nPASS guest@\r\n"
+ROUND = "NOOP\r\nTYPE I\r\nSYST\r\nPORT 127,0,0,1,4,1\r\nRETR missing.bin\r\n" #a RETR that fails, so nothing connects anywhere
+ROUND_LINES = ROUND.count("\n")
+
+def write_replay(path:str,lines:int):
+    with open(path,"w",newline="") as f:
+        f.write(LOGIN)
+        for _ in range(lines//ROUND_LINES):
+            f.write(ROUND)
+
+def run_local(replay:str,workdir:str)->tuple[float,int]:
+    #seconds, and peak RSS in KB, of one server process working through the replay
+    with open(replay,"rb") as stdin:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable,str(SERVER),"--local","--log-level","OFF"],cwd=workdir,
+                                stdin=stdin,stdout=subprocess.DEVNULL)
+        _,status,usage = os.wait4(proc.pid,0)
+        elapsed = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"server exited with {proc.returncode}")
+    return elapsed,usage.ru_maxrss
+
+def load_server():
+    spec = importlib.util.spec_from_file_location("bench_server",SERVER)
+    server = importlib.util.module_from_spec(spec)
+    sys.modules["bench_server"] = server #dataclasses look the module up
+    spec.loader.exec_module(server)
+    return server
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--max-lines",type=int,default=1_000_000)
+    argparser.add_argument("--max-lines-inprocess",type=int,default=100_000)
+    args = argparser.parse_args()
+
+    print(f"{SERVER}")
+    with tempfile.TemporaryDirectory() as workdir:
+        replay = os.path.join(workdir,"replay.txt")
+        print(f"{'--local lines':<14} {'MB in':>8} {'s':>8} {'lines/s':>10} {'peak RSS MB':>12}")
+        for lines in SIZES:
+            if lines > args.max_lines:
+                break
+            write_replay(replay,lines)
+            elapsed,rss = run_local(replay,workdir)
+            print(f"{lines:<14} {os.path.getsize(replay)/1e6:>8.1f} {elapsed:>8.2f} {lines/elapsed:>10.0f} {rss/1024:>12.1f}")
+
+    logging.disable(logging.CRITICAL)
+    server = load_server()
+    print(f"{'parseCommands':<14} {'MB in':>8} {'s':>8} {'lines/s':>10}")
+    for lines in SIZES:
+        if lines > args.max_lines_inprocess:
+            break
+        text = io.StringIO()
+        text.write(LOGIN)
+        for _ in range(lines//ROUND_LINES):
+            text.write(ROUND)
+        text = text.getvalue()
+        start = time.perf_counter()
+        server.parseCommands(server.ServerState(),text)
+        elapsed = time.perf_counter() - start
+        print(f"{lines:<14} {len(text)/1e6:>8.1f} {elapsed:>8.2f} {lines/elapsed:>10.0f}")
+
+if __name__ == "__main__":
+    main()
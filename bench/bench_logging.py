@@ -0,0 +1,47 @@
+#per-command cost of server logging: off, synchronous file writes, background queue, sampled
+#usage: python bench/bench_logging.py [commands]
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from _common import REPO  # noqa: F401 (puts the repo on sys.path)
+
+from FTP_Logging import setup_logging
+from FTP_Server import ServerState, parseCommand
+
+SCRIPT = ["USER anonymous\r","PASS guest@\r","SYST\r","TYPE I\r","NOOP\r","PORT 127,0,0,1,35,41\r","NOOP\r","TYPE A\r"]
+
+CONFIGS = {
+    "off":dict(level="OFF"),
+    "INFO, sync file":dict(level="INFO",background=False),
+    "INFO, queued":dict(level="INFO"),
+    "INFO, queued, 1/100":dict(level="INFO",sample=100),
+    "WARNING, queued":dict(level="WARNING"),
+}
+
+def run(commands:int)->float:
+    state = ServerState()
+    start = time.perf_counter()
+    for i in range(commands):
+        parseCommand(state,SCRIPT[i % len(SCRIPT)],include_command=False)
+    return time.perf_counter() - start
+
+def main():
+    commands = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'logging':<22} {'us/command':>10} {'drain ms':>9} {'log MB':>7}")
+        for name,config in CONFIGS.items():
+            logfile = Path(tmp)/"server.log"
+            pipeline = setup_logging(str(logfile),**config)
+            elapsed = run(commands)
+            start = time.perf_counter()
+            pipeline.stop() #waits for the background writer to catch up
+            drain = time.perf_counter() - start
+            size = logfile.stat().st_size/1e6 if logfile.exists() else 0
+            print(f"{name:<22} {elapsed/commands*1e6:>10.2f} {drain*1000:>9.1f} {size:>7.2f}")
+            logfile.unlink(missing_ok=True)
+
+if __name__ == "__main__":
+    main()
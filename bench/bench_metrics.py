@@ -0,0 +1,67 @@
+#what keeping metrics costs: the recording calls on their own, then pipelined NOOPs and small RETRs
+#against a server with metrics on (the default) and with --no-metrics
+#usage: python bench/bench_metrics.py [commands] [retrs]
+
+import os
+import socket
+import sys
+import time
+
+from _common import Session, drain, running_server
+
+from FTP_Metrics import Metrics
+
+def micro(n:int):
+    metrics = Metrics({"NOOP"})
+    start = time.perf_counter()
+    for i in range(n):
+        metrics.command("NOOP",1e-5,200)
+    command = (time.perf_counter() - start)/n
+    start = time.perf_counter()
+    for i in range(n):
+        metrics.transfer(1e-3,4096)
+    transfer = (time.perf_counter() - start)/n
+    print(f"Metrics.command {command*1e9:.0f} ns, Metrics.transfer {transfer*1e9:.0f} ns")
+
+def noops(port:int,count:int)->float:
+    session = Session(port)
+    session.login()
+    batch = b"NOOP\r\n"*100
+    start = time.perf_counter()
+    for _ in range(count//100):
+        session.sock.sendall(batch)
+        for _ in range(100):
+            session.line()
+    elapsed = time.perf_counter() - start
+    session.close()
+    return count/elapsed
+
+def retrs(port:int,count:int)->float:
+    session = Session(port)
+    session.login()
+    start = time.perf_counter()
+    for _ in range(count):
+        data = socket.create_connection(session.passive())
+        session.sock.sendall(b"RETR small.bin\r\n")
+        drain(data)
+        session.line()
+        session.line()
+    elapsed = time.perf_counter() - start
+    session.close()
+    return count/elapsed
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    transfers = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    micro(count)
+    common = ("--transcript","off","--log-level","OFF")
+    print(f"{'server':<14} {'NOOP/s':>10} {'RETR/s':>10}")
+    for name,args in [("metrics",()),("--no-metrics",("--no-metrics",))]:
+        with running_server(*common,*args) as (port,workdir):
+            with open(workdir/"small.bin","wb") as f:
+                f.write(os.urandom(4096))
+            noops(port,count//10) #warm up
+            print(f"{name:<14} {noops(port,count):>10.0f} {retrs(port,transfers):>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#files/sec fetching many small files: one passive GET at a time against active-mode MGET with 1, 4, 8 and 16 files
+#in flight (passive MGET goes a file at a time, each 227 waits for the file before it)
+#usage: python bench/bench_mget.py [files] [file-KB] [repeats]
+
+import logging
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+from _common import running_server
+
+import FTP_Client
+from FTP_Transcript import NullTranscript
+
+WINDOWS = [1,4,8,16]
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    kilobytes = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    logging.disable(logging.CRITICAL)
+    FTP_Client.TRANSCRIPT = NullTranscript()
+    with running_server() as (port,workdir),tempfile.TemporaryDirectory() as clientdir:
+        names = [f"small{i:05}.bin" for i in range(files)]
+        for name in names:
+            with open(workdir/name,"wb") as f:
+                f.write(os.urandom(kilobytes*1024))
+        os.chdir(clientdir) #retr_files/ lands here
+        with open("list.txt","w") as f:
+            f.write("\n".join(names))
+        conn = socket.create_connection(("127.0.0.1",port))
+        list(FTP_Client.send_commands(conn,[None]))
+        list(FTP_Client.send_commands(conn,FTP_Client.generate_connect_output()))
+
+        print(f"{files} files of {kilobytes} KB")
+        print(f"{'mode':<12} {'best s':>8} {'files/s':>8}")
+        runs = [("GET",None)] + [(f"MGET w={n}",n) for n in WINDOWS]
+        for name,window in runs:
+            best = float("inf")
+            for _ in range(repeats):
+                shutil.rmtree("retr_files",ignore_errors=True)
+                start = time.perf_counter()
+                if window is None:
+                    copied = sum(FTP_Client.process_get_passive(conn,path,i+1) for i,path in enumerate(names))
+                else:
+                    FTP_Client.MGET_WINDOW = window
+                    copied = FTP_Client.process_mget(conn,"list.txt",1,passive=False)
+                best = min(best,time.perf_counter() - start)
+                assert copied == files
+            print(f"{name:<12} {best:>8.3f} {files/best:>8.0f}")
+        list(FTP_Client.send_commands(conn,["QUIT\r\n"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#wall time of a passive GET in MODE S and MODE Z (at a few zlib levels), for a compressible log-like file
+#and an incompressible random one. loopback has bandwidth to spare, so the bytes on the wire are also
+#turned into a projected time on a slower link: max(loopback time, wire bytes / link rate)
+#usage: python bench/bench_modez.py [file-MB] [link-Mbit/s]
+
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+import zlib
+
+from _common import running_server
+
+import FTP_Client
+from FTP_Transcript import NullTranscript
+
+LEVELS = [1,6,9]
+
+def log_like(megabytes:int)->bytes:
+    rng = random.Random(0)
+    verbs = ["USER","PASS","RETR","PORT","PASV","NOOP","QUIT"]
+    lines = []
+    size = 0
+    while size < megabytes*1024*1024:
+        line = (f"2024-05-{rng.randrange(1,29):02d} {rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d} "
+                f"INFO session 10.0.{rng.randrange(256)}.{rng.randrange(256)} {rng.choice(verbs)} ok {rng.randrange(100000)}\n")
+        lines.append(line)
+        size += len(line)
+    return "".join(lines).encode()[:megabytes*1024*1024]
+
+def wire_bytes(data:bytes,level:int|None)->int:
+    if level is None:
+        return len(data)
+    return len(zlib.compress(data,level))
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    link = float(sys.argv[2]) if len(sys.argv) > 2 else 100.0
+    logging.disable(logging.CRITICAL)
+    FTP_Client.TRANSCRIPT = NullTranscript()
+    files = {"text":log_like(megabytes),"random":os.urandom(megabytes*1024*1024)}
+    print(f"{'file':<7} {'mode':<6} {'wire MB':>8} {'loopback s':>11} {f'@{link:g} Mbit/s s':>16}")
+    with tempfile.TemporaryDirectory() as clientdir:
+        os.chdir(clientdir) #retr_files/ lands here
+        for level in [None] + LEVELS:
+            args = [] if level is None else ["--deflate-level",str(level)]
+            with running_server(*args,"--log-level","OFF") as (port,workdir):
+                for name,data in files.items():
+                    (workdir/f"{name}.bin").write_bytes(data)
+                conn = socket.create_connection(("127.0.0.1",port))
+                list(FTP_Client.send_commands(conn,[None]))
+                list(FTP_Client.send_commands(conn,FTP_Client.generate_connect_output()))
+                compressed = level is not None and FTP_Client.process_mode_z(conn)
+                for name,data in files.items():
+                    start = time.perf_counter()
+                    copied = FTP_Client.process_get_passive(conn,f"{name}.bin",1,compressed)
+                    elapsed = time.perf_counter() - start
+                    assert copied == 1 and os.path.getsize("retr_files/file1") == len(data)
+                    wire = wire_bytes(data,level)
+                    projected = max(elapsed,wire*8/(link*1e6))
+                    mode = "S" if level is None else f"Z{level}"
+                    print(f"{name:<7} {mode:<6} {wire/1e6:>8.1f} {elapsed:>11.3f} {projected:>16.2f}")
+                list(FTP_Client.send_commands(conn,["QUIT\r\n"]))
+                conn.close()
+
+if __name__ == "__main__":
+    main()
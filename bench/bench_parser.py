@@ -0,0 +1,58 @@
+#parseCommand throughput over the sample inputs in Examples/example_input.py and tests.txt
+#usage: python bench/bench_parser.py [rounds]
+#set FTP_BENCH_SERVER to another FTP_Server.py to time its parser on the same inputs
+
+import importlib.util
+import inspect
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from _common import REPO
+
+def sample_lines()->list[str]:
+    example = subprocess.run([sys.executable,str(REPO/"Examples"/"example_input.py")],capture_output=True,check=True).stdout
+    lines = example.decode('utf-8').split("\n")
+    lines += [line + "\r" for line in (REPO/"tests.txt").read_text().splitlines()]
+    #plus a logged-in session, so the state machine's accepting paths get exercised too
+    lines += ["PASS guest@\r","SYST\r","TYPE I\r","NOOP\r","PORT 127,0,0,1,35,41\r","type a\r"]
+    return lines
+
+def load(path:str,name:str):
+    spec = importlib.util.spec_from_file_location(name,path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def timed(module,lines:list[str],rounds:int)->float:
+    state = module.ServerState()
+    if "state" in inspect.signature(module.parseCommand).parameters:
+        parse = lambda line: module.parseCommand(state,line,include_command=False)
+    else: #older servers keep the state in a module global
+        module.SERVER_STATE = state
+        parse = lambda line: module.parseCommand(line,include_command=False)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for line in lines:
+            parse(line)
+    return time.perf_counter() - start
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    logging.disable(logging.CRITICAL) #parser cost only, see bench_logging.py for the logging side
+    lines = sample_lines()
+    servers = {"FTP_Server.py":str(REPO/"FTP_Server.py")}
+    if "FTP_BENCH_SERVER" in os.environ:
+        servers["FTP_BENCH_SERVER"] = os.environ["FTP_BENCH_SERVER"]
+    print(f"{len(lines)} sample commands x {rounds} rounds")
+    for i,(name,path) in enumerate(servers.items()):
+        elapsed = timed(load(path,f"server{i}"),lines,rounds)
+        total = rounds*len(lines)
+        print(f"{name:<18} {total/elapsed:>12,.0f} commands/s {elapsed/total*1e6:>8.3f} us/command")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#time for the client's grammar parsers on a pathname (GET), a reply text and a domain (CONNECT)
+#10 B to 1 MB long. FTP_BENCH_CLIENT points at another copy of FTP_Client.py to compare against it;
+#--max caps the length, for parsers that would take all day on the big inputs
+#usage: python bench/bench_parsers.py [--max BYTES] [--repeats N]
+
+import argparse
+import importlib.util
+import logging
+import time
+
+from _common import CLIENT
+
+SIZES = [10,100,1000,10_000,100_000,1_000_000]
+
+def load_client():
+    spec = importlib.util.spec_from_file_location("bench_client",CLIENT)
+    client = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(client)
+    return client
+
+def best_time(parse,line:str,repeats:int)->float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        parse(line)
+        best = min(best,time.perf_counter() - start)
+    return best
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--max",type=int,default=SIZES[-1])
+    argparser.add_argument("--repeats",type=int,default=5)
+    args = argparser.parse_args()
+    logging.disable(logging.CRITICAL)
+    client = load_client()
+
+    cases = [
+        ("GET pathname",client.parse_get,lambda n: "GET " + "a/"*(n//2) + "\r\n"),
+        ("reply text",client.parse_reply,lambda n: "250 " + "x"*n + "\r\n"),
+        ("CONNECT domain",client.parse_connect,lambda n: "CONNECT " + "ab.c"*(n//4) + "d 21\r\n"),
+    ]
+    print(f"{CLIENT}")
+    print(f"{'input':<16} {'bytes':>9} {'best ms':>10} {'MB/s':>8}")
+    for name,parse,make in cases:
+        for size in SIZES:
+            if size > args.max:
+                break
+            line = make(size)
+            try:
+                elapsed = best_time(parse,line,args.repeats)
+            except RecursionError:
+                print(f"{name:<16} {size:>9} {'RecursionError':>10}")
+                continue
+            print(f"{name:<16} {size:>9} {elapsed*1000:>10.3f} {size/elapsed/1e6:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#per-GET latency for a small file: active mode (PORT, server dials back) vs passive mode (PASV, pooled data ports)
+#usage: python bench/bench_pasv.py [gets]
+
+import logging
+import os
+import socket
+import sys
+import tempfile
+import time
+
+from _common import free_port, percentile, running_server
+
+import FTP_Client
+from FTP_Transcript import NullTranscript
+
+def main():
+    gets = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    logging.disable(logging.CRITICAL)
+    FTP_Client.TRANSCRIPT = NullTranscript()
+    with running_server() as (port,workdir),tempfile.TemporaryDirectory() as clientdir:
+        (workdir/"small.txt").write_bytes(b"x"*512)
+        os.chdir(clientdir) #retr_files/ lands here
+        conn = socket.create_connection(("127.0.0.1",port))
+        list(FTP_Client.send_commands(conn,[None]))
+        list(FTP_Client.send_commands(conn,FTP_Client.generate_connect_output()))
+
+        welcoming_port = free_port()
+        print(f"{'mode':<8} {'p50 ms':>8} {'p99 ms':>8}")
+        for mode in ["active","passive"]:
+            latencies = []
+            for n in range(1,gets+1):
+                start = time.perf_counter()
+                if mode == "active":
+                    copied = FTP_Client.process_get(conn,welcoming_port,"small.txt",n)
+                    welcoming_port = free_port()
+                else:
+                    copied = FTP_Client.process_get_passive(conn,"small.txt",n)
+                latencies.append(time.perf_counter() - start)
+                assert copied == 1
+            print(f"{mode:<8} {percentile(latencies,50)*1000:>8.3f} {percentile(latencies,99)*1000:>8.3f}")
+        list(FTP_Client.send_commands(conn,["QUIT\r\n"]))
+
+if __name__ == "__main__":
+    main()
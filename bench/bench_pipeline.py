@@ -0,0 +1,32 @@
+#USER/PASS/SYST/TYPE login sequence: one round trip per command vs one pipelined batch
+#usage: python bench/bench_pipeline.py [logins]
+
+import socket
+import sys
+import time
+
+from _common import percentile, running_server
+
+import FTP_Client
+
+def login(port:int,pipeline:bool)->float:
+    with socket.create_connection(("127.0.0.1",port)) as conn:
+        list(FTP_Client.send_commands(conn,[None]))
+        start = time.perf_counter()
+        replies = list(FTP_Client.send_commands(conn,FTP_Client.generate_connect_output(),pipeline=pipeline))
+        elapsed = time.perf_counter() - start
+        assert len(replies) == 8,replies
+        list(FTP_Client.send_commands(conn,["QUIT\r\n"]))
+    return elapsed
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    with running_server() as (port,_):
+        print(f"{'mode':<10} {'p50 ms':>8} {'p99 ms':>8}")
+        for pipeline in [False,True]:
+            latencies = [login(port,pipeline) for _ in range(logins)]
+            name = "pipelined" if pipeline else "serial"
+            print(f"{name:<10} {percentile(latencies,50)*1000:>8.3f} {percentile(latencies,99)*1000:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#a client script hopping between two servers (CONNECT + GET, alternating), run as a real client process,
+#with the control-connection pool on and off (--pool-size 0 logs in again on every CONNECT)
+#usage: python bench/bench_pool.py [hops] [repeats]
+
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import CLIENT, free_port, running_server
+
+def main():
+    hops = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    with running_server() as (port_a,dir_a),running_server() as (port_b,dir_b):
+        for workdir in (dir_a,dir_b):
+            (workdir/"small.txt").write_bytes(b"x"*1024)
+        script = "".join(f"CONNECT localhost {port_a if i % 2 == 0 else port_b}\r\nGET small.txt\r\n" for i in range(hops)) + "QUIT\r\n"
+
+        print(f"{hops} hops between two servers")
+        print(f"{'pool size':<10} {'best s':>8} {'hops/s':>8}")
+        for size in [0,4]:
+            best = float("inf")
+            for _ in range(repeats):
+                with tempfile.TemporaryDirectory() as clientdir:
+                    start = time.perf_counter()
+                    subprocess.run([sys.executable,str(CLIENT),str(free_port()),"--transcript","off","--log-level","OFF",
+                                    "--pool-size",str(size)],input=script.encode(),cwd=clientdir,check=True)
+                    best = min(best,time.perf_counter() - start)
+            print(f"{size:<10} {best:>8.3f} {hops/best:>8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#client receive throughput (passive GET of one large file) for each Receiver mode and chunk size;
+#"recv 1 KB" is what the active-mode loop used to do
+#usage: python bench/bench_receive.py [file-MB] [repeats]
+
+import logging
+import os
+import socket
+import sys
+import tempfile
+import time
+
+from _common import running_server
+
+import FTP_Client
+from FTP_Transcript import NullTranscript
+
+CHUNKS_KB = [64,256,1024,4096]
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    logging.disable(logging.CRITICAL)
+    FTP_Client.TRANSCRIPT = NullTranscript()
+    modes = [mode for mode in FTP_Client.RECV_MODES if mode != "splice" or hasattr(os,"splice")]
+    with running_server() as (port,workdir),tempfile.TemporaryDirectory() as clientdir:
+        size = megabytes*1024*1024
+        with open(workdir/"big.bin","wb") as f:
+            for _ in range(megabytes):
+                f.write(os.urandom(1024*1024))
+        os.chdir(clientdir) #retr_files/ lands here
+        conn = socket.create_connection(("127.0.0.1",port))
+        list(FTP_Client.send_commands(conn,[None]))
+        list(FTP_Client.send_commands(conn,FTP_Client.generate_connect_output()))
+
+        print(f"{'mode':<10} {'chunk KB':>9} {'best s':>8} {'MB/s':>8}")
+        runs = [("recv",1)] + [(mode,kb) for mode in modes for kb in CHUNKS_KB]
+        for mode,kb in runs:
+            FTP_Client.RECV_MODE = mode
+            FTP_Client.RECV_CHUNK = kb*1024
+            best = float("inf")
+            for _ in range(repeats):
+                #don't let the previous copy's writeback land on this run
+                if os.path.exists("retr_files/file1"):
+                    os.remove("retr_files/file1")
+                os.sync()
+                start = time.perf_counter()
+                copied = FTP_Client.process_get_passive(conn,"big.bin",1)
+                best = min(best,time.perf_counter() - start)
+                assert copied == 1 and os.path.getsize("retr_files/file1") == size
+            print(f"{mode:<10} {kb:>9} {best:>8.3f} {megabytes/best:>8.0f}")
+        list(FTP_Client.send_commands(conn,["QUIT\r\n"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+#replies built per call (format + encode) vs the pre-encoded reply cache
+#usage: python bench/bench_replies.py
+
+import timeit
+
+from _common import REPO  # noqa: F401 (puts the repo on sys.path)
+
+from FTP_Server import FTPError, FTPReply
+
+CASES = {
+    "static (331)":(lambda: FTPReply.guest_ok.reply().encode('utf-8'),
+                    lambda: FTPReply.guest_ok.bytes()),
+    "TYPE I":(lambda: FTPReply.type_I.reply().encode('utf-8'),
+              lambda: FTPReply.type_I.bytes()),
+    "PORT":(lambda: FTPReply.port_success.reply(address="127.0.0.1",port="9001").encode('utf-8'),
+            lambda: FTPReply.port_success.bytes(address="127.0.0.1",port="9001")),
+    "FTPError (501)":(lambda: FTPError.invalid_parameter.reply().encode('utf-8'),
+                      lambda: FTPError.invalid_parameter.data),
+}
+
+def main():
+    number = 200_000
+    print(f"{'reply':<16} {'formatted/s':>14} {'cached/s':>14} {'speedup':>8}")
+    for name,(before,after) in CASES.items():
+        assert before() == after()
+        t_before = min(timeit.repeat(before,number=number,repeat=3))
+        t_after = min(timeit.repeat(after,number=number,repeat=3))
+        print(f"{name:<16} {number/t_before:>14,.0f} {number/t_after:>14,.0f} {t_before/t_after:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#throughput of one large GET split into 1, 2, 4 and 8 byte ranges fetched in parallel (PASV + RANG + RETR each),
+#against the plain single-connection passive GET
+#usage: python bench/bench_segments.py [file-MB] [repeats]
+
+import logging
+import os
+import socket
+import sys
+import tempfile
+import time
+
+from _common import running_server
+
+import FTP_Client
+from FTP_Transcript import NullTranscript
+
+SEGMENTS = [1,2,4,8]
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    logging.disable(logging.CRITICAL)
+    FTP_Client.TRANSCRIPT = NullTranscript()
+    with running_server() as (port,workdir),tempfile.TemporaryDirectory() as clientdir:
+        size = megabytes*1024*1024
+        with open(workdir/"big.bin","wb") as f:
+            for _ in range(megabytes):
+                f.write(os.urandom(1024*1024))
+        os.chdir(clientdir) #retr_files/ lands here
+        conn = socket.create_connection(("127.0.0.1",port))
+        list(FTP_Client.send_commands(conn,[None]))
+        list(FTP_Client.send_commands(conn,FTP_Client.generate_connect_output()))
+
+        print(f"{'mode':<12} {'best s':>8} {'MB/s':>8}")
+        runs = [("passive",None)] + [(f"segments={n}",n) for n in SEGMENTS]
+        for name,segments in runs:
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                if segments is None:
+                    copied = FTP_Client.process_get_passive(conn,"big.bin",1)
+                else:
+                    copied = FTP_Client.process_get_segmented(conn,"big.bin",1,segments)
+                best = min(best,time.perf_counter() - start)
+                assert copied == 1 and os.path.getsize("retr_files/file1") == size
+            print(f"{name:<12} {best:>8.3f} {megabytes/best:>8.0f}")
+        list(FTP_Client.send_commands(conn,["QUIT\r\n"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+#aggregate command throughput as the number of concurrent clients grows
+#usage: python bench/bench_sessions.py [commands-per-client]
+
+import sys
+import threading
+import time
+
+from _common import Session, running_server
+
+CLIENT_COUNTS = [1,2,4,8,16,32,64,128,256]
+
+def run_client(port:int,noops:int,barrier:threading.Barrier):
+    session = Session(port)
+    session.login()
+    barrier.wait()
+    for _ in range(noops):
+        session.command("NOOP")
+    session.close()
+
+def main():
+    noops = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with running_server() as (port,_):
+        print(f"{'clients':>8} {'commands':>9} {'seconds':>8} {'cmds/s':>10}")
+        for n in CLIENT_COUNTS:
+            barrier = threading.Barrier(n+1)
+            threads = [threading.Thread(target=run_client,args=(port,noops,barrier)) for _ in range(n)]
+            for t in threads:
+                t.start()
+            barrier.wait() #everyone is logged in
+            start = time.perf_counter()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+            total = n*noops
+            print(f"{n:>8} {total:>9} {elapsed:>8.3f} {total/elapsed:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+#cost of echoing the protocol transcript, per line, for each transcript sink
+#usage: python bench/bench_transcript.py [lines]
+#run it with stdout redirected (e.g. > /dev/null or | cat), results are printed to stderr
+
+import os
+import sys
+import tempfile
+import time
+
+from _common import REPO  # noqa: F401 (puts the repo on sys.path)
+
+from FTP_Transcript import MODES, open_transcript
+
+LINES = [b"USER anonymous\r\n",b"331 Guest access OK, send password.\r\n",b"NOOP\r\n",b"200 Command OK.\r\n"]
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+        for mode in MODES:
+            transcript = open_transcript(mode,path=os.path.join(tmp,"transcript.txt"))
+            start = time.perf_counter()
+            for i in range(lines):
+                transcript.write(LINES[i % len(LINES)])
+            hot = time.perf_counter() - start
+            transcript.close()
+            total = time.perf_counter() - start
+            results.append((mode,hot,total))
+    print(f"{'transcript':<10} {'us/line (hot path)':>18} {'us/line (incl. close)':>22}",file=sys.stderr)
+    for mode,hot,total in results:
+        print(f"{mode:<10} {hot/lines*1e6:>18.3f} {total/lines*1e6:>22.3f}",file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#control-channel responsiveness while RETR transfers are in flight, and transfer pool concurrency
+#usage: python bench/bench_transfers.py [transfer-workers]
+
+import re
+import sys
+import threading
+import time
+
+from _common import Session, drain, running_server
+
+FILE_SIZE = 32*1024*1024
+
+def noop_during_transfer(port:int):
+    #NOOPs from a second session: the transferring session's own replies wait for its RETR's final reply
+    session = Session(port)
+    session.login()
+    other = Session(port)
+    other.login()
+    listener,port_command = session.data_listener()
+    session.command(port_command)
+    session.sock.sendall(b"RETR big.bin\r\n")
+    conn,_ = listener.accept()
+    reader = threading.Thread(target=drain,args=(conn,0.002)) #~32 MB/s receiver
+    reader.start()
+
+    latencies = []
+    while reader.is_alive():
+        start = time.perf_counter()
+        other.command("NOOP")
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.01)
+    reader.join()
+    retr = [session.line(),session.line()]
+    session.close()
+    other.close()
+    listener.close()
+    print(f"NOOPs answered during one transfer: {len(latencies)}, "
+          f"max latency {max(latencies)*1000:.2f} ms, RETR replies {[r.strip().decode() for r in retr]}")
+
+def parallel_retrs(port:int,sessions:int):
+    def fetch():
+        session = Session(port)
+        session.login()
+        listener,port_command = session.data_listener()
+        session.command(port_command)
+        session.sock.sendall(b"RETR big.bin\r\n")
+        conn,_ = listener.accept()
+        drain(conn)
+        session.line(),session.line()
+        session.close()
+        listener.close()
+    threads = [threading.Thread(target=fetch) for _ in range(sessions)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(f"{sessions:>3} parallel RETRs: {elapsed:.3f} s, {sessions*FILE_SIZE/elapsed/1e6:.0f} MB/s aggregate")
+
+def main():
+    workers = sys.argv[1] if len(sys.argv) > 1 else "4"
+    with running_server("--transfer-workers",workers) as (port,workdir):
+        (workdir/"big.bin").write_bytes(b"\0"*FILE_SIZE)
+        noop_during_transfer(port)
+        for n in [1,4,16]:
+            parallel_retrs(port,n)
+        time.sleep(0.2)
+        stats = re.findall(r"transfers .*",(workdir/"server.log").read_text())
+        print(f"transfer pool ({workers} workers) after run: {stats[-1]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#logins/sec (connect, greeting, USER, PASS, QUIT) against the server with --workers 1, 2, 4, ... up to the core count,
+#driven by several load-generating processes with many concurrent sessions each
+#usage: python bench/bench_workers.py [seconds] [load-processes] [sessions-per-process] [max-workers]
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+from _common import running_server
+
+async def login_loop(port:int,deadline:float)->int:
+    logins = 0
+    while time.monotonic() < deadline:
+        reader,writer = await asyncio.open_connection("127.0.0.1",port)
+        await reader.readline() #220
+        writer.write(b"USER anonymous\r\nPASS guest@\r\nQUIT\r\n")
+        for _ in range(3):
+            await reader.readline()
+        writer.close()
+        await writer.wait_closed()
+        logins += 1
+    return logins
+
+def load_process(port:int,sessions:int,seconds:float)->int:
+    async def run():
+        deadline = time.monotonic() + seconds
+        return sum(await asyncio.gather(*(login_loop(port,deadline) for _ in range(sessions))))
+    return asyncio.run(run())
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    loaders = int(sys.argv[2]) if len(sys.argv) > 2 else max(2,(os.cpu_count() or 1)//2)
+    sessions = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    cores = os.cpu_count() or 1
+    most = int(sys.argv[4]) if len(sys.argv) > 4 else cores
+    counts = sorted({1,2,4,8,16,most} & set(range(1,most+1)))
+    print(f"{cores} cores, {loaders} load processes x {sessions} sessions, {seconds:.0f} s each")
+    print(f"{'workers':<8} {'logins/s':>9} {'vs 1':>6}")
+    base = None
+    with multiprocessing.Pool(loaders) as pool:
+        for workers in counts:
+            with running_server("--workers",str(workers),"--transcript","off","--log-level","OFF") as (port,_):
+                logins = sum(pool.starmap(load_process,[(port,sessions,seconds)]*loaders))
+            rate = logins/seconds
+            base = base or rate
+            print(f"{workers:<8} {rate:>9.0f} {rate/base:>5.1f}x")
+
+if __name__ == "__main__":
+    main()
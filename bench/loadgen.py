@@ -0,0 +1,272 @@
+#load generator: N concurrent clients running one scenario at a time against FTP_Server.py (or the copy
+#FTP_BENCH_SERVER points at), results as JSON so two releases' runs can be compared with --baseline
+#scenarios:
+#  login      connect, USER, PASS, QUIT, over and over: a login storm
+#  noop       one logged-in session per client, NOOP ping-pong
+#  retr       PASV + RETR of a file of each --sizes, over and over (one scenario per size, e.g. retr_1M)
+#every command waits for its reply before the next goes out, so each reply's latency is measured on its own
+#usage: python bench/loadgen.py [--clients N] [--seconds S] [--scenarios login,noop,retr] [--sizes 1K,1M,1G]
+#                               [--processes P] [--server-args "..."] [--output FILE] [--baseline FILE]
+
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import time
+
+from _common import REPO, SERVER, percentile, running_server
+
+UNITS = {"K":1024,"M":1024**2,"G":1024**3}
+
+def parse_size(text:str)->int:
+    if text[-1:].upper() in UNITS:
+        return int(text[:-1])*UNITS[text[-1].upper()]
+    return int(text)
+
+class ReplyError(Exception):
+    pass
+
+class Result:
+    #one scenario's raw samples (seconds) and counts, from one process
+    def __init__(self):
+        self.latency:list[float] = [] #every command's round trip
+        self.sessions:list[float] = [] #login: connect to 221
+        self.transfers:list[float] = [] #retr: RETR sent to 250
+        self.first_byte:list[float] = [] #retr: RETR sent to the first data byte
+        self.bytes = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def merge(self,other:"Result"):
+        self.latency += other.latency
+        self.sessions += other.sessions
+        self.transfers += other.transfers
+        self.first_byte += other.first_byte
+        self.bytes += other.bytes
+        self.errors += other.errors
+        self.elapsed = max(self.elapsed,other.elapsed)
+
+class Client:
+    def __init__(self,reader:asyncio.StreamReader,writer:asyncio.StreamWriter,result:Result):
+        self.reader = reader
+        self.writer = writer
+        self.result = result
+
+    @classmethod
+    async def connect(cls,port:int,result:Result)->"Client":
+        reader,writer = await asyncio.open_connection("127.0.0.1",port)
+        client = cls(reader,writer,result)
+        await client.expect(b"220")
+        return client
+
+    async def expect(self,code:bytes)->bytes:
+        reply = await self.reader.readline()
+        if not reply.startswith(code):
+            raise ReplyError(reply or b"connection closed")
+        return reply
+
+    async def command(self,line:bytes,code:bytes)->bytes:
+        start = time.perf_counter()
+        self.writer.write(line)
+        reply = await self.expect(code)
+        self.result.latency.append(time.perf_counter() - start)
+        return reply
+
+    async def login(self):
+        await self.command(b"USER anonymous\r\n",b"331")
+        await self.command(b"PASS guest@\r\n",b"230")
+
+    async def close(self,quit:bool=True):
+        try:
+            if quit:
+                await self.command(b"QUIT\r\n",b"221")
+        finally:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+
+async def login_client(port:int,deadline:float,result:Result,**_):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            client = await Client.connect(port,result)
+            try:
+                await client.login()
+            finally:
+                await client.close()
+        except (OSError,ReplyError):
+            result.errors += 1
+            continue
+        result.sessions.append(time.perf_counter() - start)
+
+async def noop_client(port:int,deadline:float,result:Result,**_):
+    client = await Client.connect(port,result)
+    try:
+        await client.login()
+        while time.monotonic() < deadline:
+            await client.command(b"NOOP\r\n",b"200")
+    finally:
+        await client.close()
+
+async def retr_client(port:int,deadline:float,result:Result,name:str,size:int,**_):
+    client = await Client.connect(port,result)
+    try:
+        await client.login()
+        while time.monotonic() < deadline:
+            reply = await client.command(b"PASV\r\n",b"227")
+            nums = reply[reply.index(b"(")+1:reply.index(b")")].decode().split(",")
+            reader,writer = await asyncio.open_connection(".".join(nums[:4]),int(nums[4])*256 + int(nums[5]))
+            start = time.perf_counter()
+            client.writer.write(f"RETR {name}\r\n".encode())
+            received = 0
+            try:
+                while chunk := await reader.read(256*1024):
+                    if received == 0:
+                        result.first_byte.append(time.perf_counter() - start)
+                    received += len(chunk)
+            finally:
+                writer.close()
+            await client.expect(b"150")
+            await client.expect(b"250")
+            result.transfers.append(time.perf_counter() - start)
+            result.bytes += received
+            if received != size:
+                result.errors += 1
+    finally:
+        await client.close()
+
+SCENARIOS = {"login":login_client,"noop":noop_client,"retr":retr_client}
+
+def run_clients(port:int,scenario:str,clients:int,seconds:float,name:str="",size:int=0)->Result:
+    #one process' share of the clients, all started at once
+    async def run()->Result:
+        result = Result()
+        deadline = time.monotonic() + seconds
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*(SCENARIOS[scenario](port,deadline,result,name=name,size=size) for _ in range(clients)),
+                                        return_exceptions=True)
+        result.errors += sum(isinstance(outcome,Exception) for outcome in outcomes)
+        result.elapsed = time.perf_counter() - start #past seconds by however long the last RETRs took
+        return result
+    return asyncio.run(run())
+
+def run_scenario(pool,port:int,scenario:str,clients:int,processes:int,seconds:float,name:str="",size:int=0)->Result:
+    shares = [clients//processes + (i < clients%processes) for i in range(processes)]
+    jobs = [(port,scenario,share,seconds,name,size) for share in shares if share > 0]
+    result = Result()
+    for part in (pool.starmap(run_clients,jobs) if pool is not None else [run_clients(*jobs[0])]):
+        result.merge(part)
+    return result
+
+def milliseconds(samples:list[float])->dict[str,float]:
+    return {"p50":round(percentile(samples,50)*1e3,3),"p99":round(percentile(samples,99)*1e3,3)}
+
+def summarize(scenario:str,result:Result)->dict:
+    elapsed = result.elapsed or 1e-9
+    summary:dict = {"seconds":round(elapsed,3),"errors":result.errors,"commands":len(result.latency),
+                    "commands_per_sec":round(len(result.latency)/elapsed,1),"latency_ms":milliseconds(result.latency)}
+    if scenario == "login":
+        summary.update(sessions=len(result.sessions),sessions_per_sec=round(len(result.sessions)/elapsed,1),
+                       session_ms=milliseconds(result.sessions))
+    elif scenario == "retr":
+        summary.update(transfers=len(result.transfers),transfers_per_sec=round(len(result.transfers)/elapsed,2),
+                       bytes=result.bytes,MB_per_sec=round(result.bytes/1e6/elapsed,2),
+                       transfer_ms=milliseconds(result.transfers),first_byte_ms=milliseconds(result.first_byte))
+    return summary
+
+def git_revision()->str|None:
+    try:
+        return subprocess.run(["git","rev-parse","--short","HEAD"],cwd=REPO,capture_output=True,text=True,check=True).stdout.strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+def compare(report:dict,baseline:dict,tolerance:float)->list[str]:
+    #rates may not drop, latencies may not grow, by more than tolerance; returns what did
+    regressions = []
+    print(f"{'scenario':<12} {'metric':<22} {'baseline':>12} {'now':>12} {'change':>8}",file=sys.stderr)
+    for scenario,now in report["scenarios"].items():
+        old = baseline.get("scenarios",{}).get(scenario)
+        if old is None:
+            continue
+        pairs = [(key,old[key],now[key],True) for key in now if key.endswith("_per_sec") and key in old]
+        pairs += [(f"{key}.{p}",old[key][p],now[key][p],False)
+                  for key in now if key.endswith("_ms") and key in old for p in ("p50","p99")]
+        for metric,before,after,higher_better in pairs:
+            change = (after - before)/before if before else 0.0
+            worse = -change if higher_better else change
+            flag = " REGRESSION" if worse > tolerance else ""
+            print(f"{scenario:<12} {metric:<22} {before:>12} {after:>12} {change:>+7.1%}{flag}",file=sys.stderr)
+            if flag:
+                regressions.append(f"{scenario} {metric}")
+    return regressions
+
+def main():
+    argparser = argparse.ArgumentParser(description="concurrent-client load against FTP_Server.py, reported as JSON")
+    argparser.add_argument("--clients",type=int,default=16,help="concurrent clients per scenario")
+    argparser.add_argument("--seconds",type=float,default=5,help="how long each scenario runs (a RETR under way is finished)")
+    argparser.add_argument("--scenarios",default="login,noop,retr",help="comma-separated, from: " + ",".join(SCENARIOS))
+    argparser.add_argument("--sizes",default="1K,1M,64M,1G",help="file sizes for retr, with K/M/G suffixes")
+    argparser.add_argument("--processes",type=int,default=1,help="load-generating processes the clients are spread over")
+    argparser.add_argument("--server-args",default="--transcript off --log-level OFF",help="extra FTP_Server.py arguments, one string")
+    argparser.add_argument("--output",default=None,help="write the JSON here instead of stdout")
+    argparser.add_argument("--baseline",default=None,help="an earlier run's JSON: print the differences, exit 1 on a regression")
+    argparser.add_argument("--tolerance",type=float,default=0.10,help="change beyond which --baseline calls it a regression")
+    args = argparser.parse_args()
+
+    scenarios = [scenario for scenario in args.scenarios.split(",") if scenario]
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            argparser.error(f"unknown scenario {scenario!r}")
+    sizes = [(text,parse_size(text)) for text in args.sizes.split(",") if text]
+
+    report = {"meta":{"server":str(SERVER),"revision":git_revision(),"python":platform.python_version(),
+                      "platform":platform.platform(),"cpus":os.cpu_count(),"clients":args.clients,
+                      "processes":args.processes,"seconds":args.seconds,"server_args":args.server_args,
+                      "started":datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")},
+              "scenarios":{}}
+    pool = multiprocessing.Pool(args.processes) if args.processes > 1 else None
+    try:
+        with running_server(*shlex.split(args.server_args)) as (port,workdir):
+            runs = []
+            for scenario in scenarios:
+                if scenario != "retr":
+                    runs.append((scenario,scenario,"",0))
+                    continue
+                for text,size in sizes:
+                    name = f"load_{text}.bin"
+                    with open(workdir/name,"wb") as f:
+                        f.truncate(size) #sparse: sendfile doesn't care what's in it, and 1 GB costs no disk
+                    runs.append((f"retr_{text}",scenario,name,size))
+            for key,scenario,name,size in runs:
+                print(f"{key}: {args.clients} clients, {args.seconds:g} s",file=sys.stderr)
+                result = run_scenario(pool,port,scenario,args.clients,args.processes,args.seconds,name,size)
+                report["scenarios"][key] = summarize(scenario,result)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    text = json.dumps(report,indent=2)
+    if args.output is not None:
+        with open(args.output,"w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(report,json.load(f),args.tolerance)
+        if regressions:
+            print("regressions: " + ", ".join(regressions),file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()